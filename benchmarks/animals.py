@@ -0,0 +1,53 @@
+import sys
+import time
+import numpy as np
+
+import game
+from sweep import apply_params
+
+ANIMAL_COUNTS = [5, 50, 500, 5000]
+TICKS = 200
+SEED = 10
+# clocks to fast-forward a fresh game instance to
+CLOCKS = [1000, 10000, 50000]
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+# time for a fresh game instance to get to clock by querying every tick, and with advance_to once the checkpoints
+# along the way exist (which the first pass leaves behind)
+def fast_forward(clock):
+    instance = game.Game(SEED, 'fast')
+    start = time.perf_counter()
+    while instance.game_clock < clock:
+        instance.query((0, 0), is_runner = False)
+    stepped = time.perf_counter() - start
+    instance = game.Game(SEED, 'fast')
+    start = time.perf_counter()
+    instance.advance_to(clock)
+    return stepped, time.perf_counter() - start
+
+# cost of moving every animal once as the number of animals grows, and of getting a timestep's generator
+# (reseeding the global rng was the old way, building a fresh Philox or moving a reused one's counter the new one)
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or ANIMAL_COUNTS
+    rng = game.CounterRNG(SEED)
+    print(f"np.random.seed: {per_call(lambda: np.random.seed(SEED), TICKS) * 1e6:.1f}us, "
+          f"game_rng: {per_call(lambda: game.game_rng(SEED, 1, game.ANIMAL_STREAM), TICKS) * 1e6:.1f}us, "
+          f"CounterRNG.at: {per_call(lambda: rng.at(1, game.ANIMAL_STREAM), TICKS) * 1e6:.1f}us")
+    print(f"{'animals':>8} {'update (us)':>12} {'query (us)':>11}")
+    for count in counts:
+        apply_params(dict(NUM_ANIMALS = count))
+        instance = game.Game(SEED, 'fast')
+        update = per_call(instance.update_animals, TICKS)
+        query = per_call(lambda: instance.query((0, 0), is_runner = True), TICKS)
+        print(f"{count:>8} {update * 1e6:>12.1f} {query * 1e6:>11.1f}")
+
+    apply_params(dict(NUM_ANIMALS = counts[0]))
+    print(f"{'clock':>8} {'query every tick (ms)':>22} {'advance_to (ms)':>16}")
+    for clock in CLOCKS:
+        stepped, advanced = fast_forward(clock)
+        print(f"{clock:>8} {stepped * 1e3:>22.1f} {advanced * 1e3:>16.2f}")
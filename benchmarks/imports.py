@@ -0,0 +1,42 @@
+import sys
+import json
+import subprocess
+
+# modules every process that doesn't draw anything starts from
+HEADLESS_MODULES = ['runner', 'relayer', 'host', 'engine', 'spawn', 'replay']
+# modules that only the visualizer (and exporting replays) should ever load
+PLOTTING_MODULES = ('matplotlib',)
+REPEATS = 5
+
+# run in a fresh interpreter: import the module and report how long that took and what it loaded
+PROBE = '''
+import sys, json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps(dict(seconds = time.perf_counter() - start, modules = sorted(sys.modules))))
+'''
+
+def probe(module):
+    output = subprocess.run([sys.executable, '-c', PROBE.format(module = module)], capture_output = True,
+                            text = True, check = True).stdout
+    return json.loads(output)
+
+# plotting modules among the loaded ones
+def plotting(modules):
+    return [name for name in modules if name.split('.')[0] in PLOTTING_MODULES]
+
+# how long a fresh process takes to import each headless entry point, best of REPEATS, and how many modules
+# it loads on the way, failing if any of them pulls in plotting code
+if __name__ == '__main__':
+    modules = sys.argv[1:] or HEADLESS_MODULES
+    print(f"{'module':>10} {'import (ms)':>12} {'modules':>8}")
+    failed = []
+    for module in modules:
+        results = [probe(module) for _ in range(REPEATS)]
+        loaded = results[0]['modules']
+        print(f"{module:>10} {min(result['seconds'] for result in results) * 1e3:>12.1f} {len(loaded):>8}")
+        if plotting(loaded):
+            failed.append(module)
+            print(f"{module} imports {', '.join(plotting(loaded)[:3])}")
+    if failed:
+        sys.exit(f"plotting code imported by {', '.join(failed)}")
@@ -0,0 +1,34 @@
+import sys
+import numpy as np
+
+import runner
+from engine import HeadlessGame
+
+SEEDS = range(10, 16)
+TICKS = 100
+
+# known cells (not BLANK_INDEX) on the map of every relayer, and across all of them, after each tick
+# along with the bytes sent so far, stopping early if the game ends
+def knowledge_curve(seed, ticks):
+    game = HeadlessGame(seed)
+    curve = []
+    while not game.finished() and game.ticks < ticks:
+        game.tick()
+        known = np.array([relayer.terrains >= 0 for relayer in game.relayers])
+        curve.append((game.bus.bytes, known.sum(axis = (1, 2)).mean(), known.any(axis = 0).sum()))
+    return np.array(curve)
+
+if __name__ == '__main__':
+    seeds = [int(arg) for arg in sys.argv[1:]] or SEEDS
+    print(f"{'packing':>8} {'seed':>5} {'ticks':>6} {'kB sent':>8} {'known/relayer':>14} {'known (any)':>12}"
+          f" {'cells/kB':>9}")
+    for mode in runner.PACKING_MODES:
+        runner.PACKING_MODE = mode
+        rates = []
+        for seed in seeds:
+            curve = knowledge_curve(seed, TICKS)
+            sent, per_relayer, union = curve[-1]
+            rates.append(per_relayer / (sent / 1000))
+            print(f"{mode:>8} {seed:>5} {len(curve):>6} {sent / 1000:>8.1f} {per_relayer:>14.0f} {union:>12.0f}"
+                  f" {rates[-1]:>9.1f}")
+        print(f"{mode:>8} {'mean':>5} {'':>6} {'':>8} {'':>14} {'':>12} {np.mean(rates):>9.1f}")
@@ -0,0 +1,39 @@
+import sys
+import time
+import numpy as np
+
+import game
+from sweep import apply_params
+
+LOCATION_COUNTS = [8, 64, 512, 4096]
+# (map side, number of animals)
+WORLDS = [(100, 5), (100, 500), (1000, 5000)]
+TICKS = 20
+SEED = 10
+
+# time to look at the game for every one of locations each tick, one observe per location and one observe_many for all
+def observe_times(instance, locations):
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        instance.step()
+        for location in locations:
+            instance.observe(location, is_runner = True)
+    single = (time.perf_counter() - start) / TICKS
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        instance.query_many(locations, is_runner = True)
+    return single, (time.perf_counter() - start) / TICKS
+
+# per-tick cost of telling many runners what they see, as a host or the engine does for all of its runners
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or LOCATION_COUNTS
+    print(f"{'map':>6} {'animals':>8} {'locations':>10} {'observe (ms)':>13} {'observe_many (ms)':>18} {'speedup':>8}")
+    for side, animals in WORLDS:
+        apply_params(dict(MAP_DIMENSIONS = (side, side), NUM_ANIMALS = animals))
+        instance = game.Game(SEED, 'fast')
+        rng = np.random.default_rng(SEED)
+        for count in counts:
+            locations = [tuple(location) for location in
+                         rng.integers(0, game.MAP_DIMENSIONS, size = (count, 2)).tolist()]
+            single, many = observe_times(instance, locations)
+            print(f"{side:>6} {animals:>8} {count:>10} {single * 1e3:>13.2f} {many * 1e3:>18.2f} {single / many:>8.1f}")
@@ -0,0 +1,38 @@
+import sys
+import time
+import numpy as np
+
+from planner import Planner
+
+# side lengths of the square maps to benchmark
+SIZES = [100, 300, 1000]
+# steps walked towards each goal, learning the cost of the cells around the runner after every one
+STEPS = 50
+VIEW_RADIUS = 2
+SEED = 262
+
+# walk from one corner towards the far corner, revealing terrain like a runner would
+# returns the time of the first search and the median time of every step after it
+def walk(size):
+    rng = np.random.default_rng(SEED)
+    costs = rng.choice([1, 2, 4, 11], size = (size, size))
+    planner = Planner((size, size))
+    location, goal = (size // 10, size // 10), (size - 1 - size // 10, size - 1 - size // 10)
+    times = []
+    for _ in range(STEPS):
+        i, j = location
+        rows = slice(max(i - VIEW_RADIUS, 0), i + VIEW_RADIUS + 1)
+        cols = slice(max(j - VIEW_RADIUS, 0), j + VIEW_RADIUS + 1)
+        cells = (np.arange(size * size).reshape(size, size)[rows, cols]).ravel()
+        start = time.perf_counter()
+        planner.set_costs(cells.tolist(), costs.ravel()[cells].tolist())
+        location = planner.next_step(location, goal)
+        times.append(time.perf_counter() - start)
+    return times[0], np.median(times[1:])
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print(f"{'map':>12} {'first search (ms)':>18} {'median step (ms)':>17}")
+    for size in sizes:
+        first, step = walk(size)
+        print(f"{f'{size}x{size}':>12} {first * 1e3:>18.2f} {step * 1e3:>17.3f}")
@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+from engine import HeadlessGame
+from replay import Replay, play
+
+SEEDS = range(10, 14)
+MAX_TICKS = 500
+SEEKS = 200
+
+# cost of writing a trace while playing, how long it takes to look at random ticks of it,
+# and how fast it renders to a frame archive compared to playing the game
+if __name__ == '__main__':
+    seeds = [int(arg) for arg in sys.argv[1:]] or SEEDS
+    print(f"{'seed':>5} {'ticks':>6} {'play ms':>8} {'traced ms':>10} {'trace kB':>9} {'open ms':>8}"
+          f" {'seek ms':>8} {'export ms':>10}")
+    for seed in seeds:
+        with tempfile.TemporaryDirectory() as path:
+            plain = HeadlessGame(seed).run(MAX_TICKS)
+            traced = HeadlessGame(seed, path).run(MAX_TICKS)
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+            start = time.perf_counter()
+            replay = Replay(path)
+            opened = time.perf_counter() - start
+            ticks = np.random.default_rng(seed).integers(replay.ticks, size = SEEKS)
+            start = time.perf_counter()
+            for tick in ticks:
+                replay.runners(tick), replay.animals(tick), replay.messages(tick), replay.knowledge(tick)
+            seek = (time.perf_counter() - start) / SEEKS
+
+            start = time.perf_counter()
+            play(replay, 0, replay.ticks, os.path.join(path, 'frames.npz'))
+            export = time.perf_counter() - start
+        print(f"{seed:>5} {plain.ticks:>6} {plain.wall_time * 1e3:>8.0f} {traced.wall_time * 1e3:>10.0f}"
+              f" {size / 1000:>9.1f} {opened * 1e3:>8.2f} {seek * 1e3:>8.3f} {export * 1e3:>10.0f}")
@@ -0,0 +1,90 @@
+import sys
+import time
+import resource
+import argparse
+import multiprocessing
+import numpy as np
+
+from config import apply_config, current_config
+from game import Game
+from engine import HeadlessGame
+
+RUNNER_COUNTS = [8, 32, 128, 512]
+RELAYER_COUNTS = [5, 16, 64]
+TICKS = 20
+SEED = 10
+
+# bytes of memory held by obj and everything it refers to, counting nothing in seen (which it adds to)
+def state_bytes(obj, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(state_bytes(key, seen) + state_bytes(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(state_bytes(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += state_bytes(vars(obj), seen)
+    return size
+
+# state an agent keeps on top of what every process has anyway: its own game instance (mostly the shared,
+# memory-mapped world), its connections, which stand in for sockets here, and the other agents
+def agent_bytes(agent, shared):
+    return state_bytes(agent, (set(shared) - {id(agent)}) | {id(agent.game_instance)})
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# play up to ticks timesteps of one configuration, run in a fresh process so that its memory is its own
+def run_config(task):
+    num_runners, num_relayers, ticks = task
+    try:
+        apply_config(current_config()._replace(num_runners = num_runners, num_relayers = num_relayers))
+        # what every runner and relayer process has before it sets up its own agent
+        Game(SEED)
+        floor = rss_mb()
+        start = time.perf_counter()
+        game = HeadlessGame(SEED)
+        setup = time.perf_counter() - start
+        times = []
+        while not game.finished() and game.ticks < ticks:
+            start = time.perf_counter()
+            game.tick()
+            times.append(time.perf_counter() - start)
+        connections = [id(end) for runner in game.runners for end in runner.sockets]
+        connections += [id(end) for relayer in game.relayers
+                        for end in [*relayer.relayer_sockets.values(), *relayer.runner_connections]]
+        connections += [id(agent) for agent in game.runners + game.relayers]
+        return dict(times = np.array(times), setup = setup, floor = floor, messages = game.bus.messages,
+                    runner = max(agent_bytes(runner, connections) for runner in game.runners) / 2 ** 10,
+                    relayer = max(agent_bytes(relayer, connections) for relayer in game.relayers) / 2 ** 10)
+    except Exception as e:
+        return dict(error = f"{type(e).__name__}: {e}")
+
+# how far the game scales in one process: ticks per second and per-tick latency of the whole lock-step game,
+# and the memory each runner and relayer process would need when they run separately: what every process has
+# (the interpreter with the game loaded and the world attached) plus the state of the biggest agent of its kind
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Time headless games as the number of runners and relayers grows")
+    parser.add_argument('--runners', default = ','.join(map(str, RUNNER_COUNTS)), help = "comma separated counts")
+    parser.add_argument('--relayers', default = ','.join(map(str, RELAYER_COUNTS)), help = "comma separated counts")
+    parser.add_argument('--ticks', type = int, default = TICKS)
+    args = parser.parse_args()
+    tasks = [(runners, relayers, args.ticks) for relayers in map(int, args.relayers.split(','))
+             for runners in map(int, args.runners.split(','))]
+
+    print(f"{'runners':>8} {'relayers':>9} {'setup (s)':>10} {'ticks/s':>8} {'p50 (ms)':>9} {'p90 (ms)':>9}"
+          f" {'p99 (ms)':>9} {'msgs/tick':>10} {'process (MB)':>13} {'+ runner (kB)':>14} {'+ relayer (kB)':>15}")
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild = 1) as pool:
+        for (runners, relayers, _), result in zip(tasks, pool.imap(run_config, tasks)):
+            if 'error' in result:
+                print(f"{runners:>8} {relayers:>9}  failed: {result['error']}")
+                continue
+            times = result['times']
+            p50, p90, p99 = np.percentile(times, [50, 90, 99]) * 1e3
+            print(f"{runners:>8} {relayers:>9} {result['setup']:>10.2f} {len(times) / times.sum():>8.1f}"
+                  f" {p50:>9.1f} {p90:>9.1f} {p99:>9.1f} {result['messages'] / len(times):>10.0f}"
+                  f" {result['floor']:>13.1f} {result['runner']:>14.1f} {result['relayer']:>15.1f}")
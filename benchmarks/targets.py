@@ -0,0 +1,61 @@
+import sys
+import time
+import numpy as np
+
+from common import LINF_SWEEP_MIN
+from spatial import UncheckedIndex
+
+# side lengths of the square maps to benchmark
+SIZES = [100, 300, 1000]
+# fraction of the map that has already been checked, late game is where ring scanning hurts
+CHECKED_FRACTIONS = [0.5, 0.9, 0.99]
+QUERIES = 200
+SEED = 262
+
+# the old Relayer.find_target search: test every cell of each growing ring one at a time
+def ring_scan(checked, location):
+    i, j = location
+    rows, cols = checked.shape
+    for radius in range(LINF_SWEEP_MIN, max(i, j, rows - 1 - i, cols - 1 - j) + 1):
+        imin, imax = max(i - radius, 0), min(i + radius, rows - 1)
+        jmin, jmax = max(j - radius, 0), min(j + radius, cols - 1)
+        coords = []
+        if i - radius >= 0:
+            coords.extend([(i - radius, j_) for j_ in range(jmin, jmax + 1)])
+        if j - radius >= 0:
+            coords.extend([(i_, j - radius) for i_ in range(imin, imax + 1)])
+        if i + radius < rows:
+            coords.extend([(i + radius, j_) for j_ in range(jmin, jmax + 1)])
+        if j + radius < cols:
+            coords.extend([(i_, j + radius) for i_ in range(imin, imax + 1)])
+        for coord in coords:
+            if not checked[coord]:
+                return coord
+    return None
+
+# checks whole 8x8 blocks at a time so that what's left is clustered, like the parts of a map nobody has reached
+def build_index(size, fraction, rng):
+    index = UncheckedIndex((size, size))
+    blocks = -(-size // 8)
+    chosen = rng.random((blocks, blocks)) < fraction
+    grid = np.kron(chosen, np.ones((8, 8), dtype = bool))[:size, :size]
+    index.mark(*np.nonzero(grid))
+    return index
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    rng = np.random.default_rng(SEED)
+    print(f"{'map':>12} {'checked':>8} {'ring scan (ms)':>15} {'index (ms)':>11} {'speedup':>8}")
+    for size in sizes:
+        for fraction in CHECKED_FRACTIONS:
+            index = build_index(size, fraction, rng)
+            locations = [tuple(location) for location in rng.integers(0, size, (QUERIES, 2)).tolist()]
+            start = time.perf_counter()
+            expected = [ring_scan(index.checked, location) for location in locations]
+            scan = (time.perf_counter() - start) / QUERIES
+            start = time.perf_counter()
+            found = [index.nearest(location, LINF_SWEEP_MIN) for location in locations]
+            indexed = (time.perf_counter() - start) / QUERIES
+            assert found == expected
+            print(f"{f'{size}x{size}':>12} {fraction:>8.2f} {scan * 1e3:>15.3f} {indexed * 1e3:>11.3f}"
+                  f" {scan / indexed:>7.1f}x")
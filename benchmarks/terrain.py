@@ -0,0 +1,62 @@
+import sys
+import time
+import numpy as np
+
+from game import *
+from sweep import apply_params
+
+# side lengths of the square maps to benchmark
+SIZES = [100, 1000, 4000]
+# the classic generator is far too slow past this size to be worth waiting for
+CLASSIC_SIZE_LIMIT = 1000
+SEED = 262
+# side lengths of the square maps to play on with chunked terrain, and how many local views to look at on each
+CHUNKED_SIZES = [1000, 10000, 100000]
+VIEWS = 1000
+
+# time a single call of fn and return (result, seconds)
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def bench_generators(sizes):
+    print(f"{'map':>12} {'classic (s)':>12} {'fast (s)':>10} {'speedup':>8}")
+    for size in sizes:
+        dims = (size, size)
+        _, fast = timed(generate_terrain_wavefront, game_rng(SEED, 0, TERRAIN_STREAM), dims)
+        if size <= CLASSIC_SIZE_LIMIT:
+            _, classic = timed(generate_terrain_classic, game_rng(SEED, 0, TERRAIN_STREAM), dims)
+            print(f"{f'{size}x{size}':>12} {classic:>12.3f} {fast:>10.3f} {classic / fast:>7.1f}x")
+        else:
+            print(f"{f'{size}x{size}':>12} {'skipped':>12} {fast:>10.3f} {'-':>8}")
+
+# full Game construction at the configured MAP_DIMENSIONS
+def bench_game_construction():
+    for mode in TERRAIN_MODES:
+        _, seconds = timed(Game, SEED, mode)
+        print(f"Game({SEED}, '{mode}') at {MAP_DIMENSIONS}: {seconds:.3f}s")
+
+# Game construction and local views with 'chunked' terrain on maps far too big to generate whole, and how much
+# of the map ends up generated: the first look at each location generates its chunk, looking again doesn't
+def bench_chunked(sizes):
+    print(f"{'map':>14} {'construct (s)':>14} {'first view (us)':>16} {'again (us)':>11} {'terrain (MB)':>13}")
+    for size in sizes:
+        apply_params(dict(MAP_DIMENSIONS = (size, size)))
+        instance, construct = timed(Game, SEED, 'chunked')
+        locations = [tuple(loc) for loc in np.random.default_rng(SEED).integers(size, size = (VIEWS, 2)).tolist()]
+        views = []
+        for _ in range(2):
+            start = time.perf_counter()
+            for location in locations:
+                instance.query(location, is_runner = False)
+            views.append((time.perf_counter() - start) / VIEWS)
+        print(f"{f'{size}x{size}':>14} {construct:>14.3f} {views[0] * 1e6:>16.1f} {views[1] * 1e6:>11.1f}"
+              f" {instance.terrain.nbytes / 1e6:>13.1f}")
+    apply_params(dict(MAP_DIMENSIONS = MAP_DIMENSIONS))
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    bench_generators(sizes)
+    bench_game_construction()
+    bench_chunked(CHUNKED_SIZES)
@@ -0,0 +1,70 @@
+import sys
+import time
+from collections import Counter, defaultdict
+import numpy as np
+
+import topology
+from sweep import apply_params
+from engine import HeadlessGame
+
+RELAYER_COUNTS = [5, 10, 25, 50, 100, 150]
+TICKS = 20
+SEED = 10
+
+# sequential message hops from the start of a sync until the last relayer is done with it, if every
+# message takes one hop and nothing else takes any time
+def sync_hops(network, tick = 0):
+    stages = [network.stages(id, tick) for id in range(network.num_relayers)]
+    done = [0] * network.num_relayers
+    clock = [0] * network.num_relayers
+    sent = [False] * network.num_relayers
+    needed = [Counter() for _ in range(network.num_relayers)]
+    arrivals = defaultdict(list)
+    progress = True
+    while progress:
+        progress = False
+        for id in range(network.num_relayers):
+            while done[id] < len(stages[id]):
+                send_to, wait_for = stages[id][done[id]]
+                if not sent[id]:
+                    for peer in send_to:
+                        arrivals[(id, peer)].append(clock[id] + 1)
+                    sent[id] = True
+                    needed[id].update(wait_for)
+                if any(len(arrivals[(peer, id)]) < n for peer, n in needed[id].items()):
+                    break
+                clock[id] = max([clock[id]] + [arrivals[(peer, id)][n - 1] for peer, n in needed[id].items()])
+                done[id] += 1
+                sent[id] = False
+                progress = True
+    assert all(done[id] == len(stages[id]) for id in range(network.num_relayers)), "sync deadlocked"
+    return max(clock)
+
+def messages_per_tick(network, tick = 0):
+    return sum(len(send_to) for id in range(network.num_relayers) for send_to, _ in network.stages(id, tick))
+
+# play a few timesteps in the engine, returning the mean wall time per tick and how much of what the
+# relayers know between them the average relayer knows
+def engine_run(num_relayers, ticks):
+    apply_params(dict(NUM_RELAYERS = num_relayers))
+    game = HeadlessGame(SEED)
+    start = time.perf_counter()
+    while not game.finished() and game.ticks < ticks:
+        game.tick()
+    elapsed = (time.perf_counter() - start) / max(game.ticks, 1)
+    known = np.array([relayer.terrains >= 0 for relayer in game.relayers])
+    return elapsed, known.sum(axis = (1, 2)).mean() / max(known.any(axis = 0).sum(), 1)
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or RELAYER_COUNTS
+    print(f"{'topology':>9} {'relayers':>9} {'conns/relayer':>14} {'msgs/tick':>10} {'hops/tick':>10}"
+          f" {'ticks to spread':>16} {'ms/tick':>8} {'known':>6}")
+    for name in topology.TOPOLOGIES:
+        topology.TOPOLOGY = name
+        for num_relayers in counts:
+            network = topology.make_topology(num_relayers)
+            connections = max(len(network.neighbors(id)) for id in range(num_relayers))
+            spread = network.period() if name == 'gossip' else 1
+            seconds, known = engine_run(num_relayers, TICKS)
+            print(f"{name:>9} {num_relayers:>9} {connections:>14} {messages_per_tick(network):>10}"
+                  f" {sync_hops(network):>10} {spread:>16} {seconds * 1e3:>8.1f} {known:>6.2f}")
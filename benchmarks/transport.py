@@ -0,0 +1,52 @@
+import sys
+import time
+import multiprocessing
+import numpy as np
+
+from common import PORT_START, RUNNER_TRANSMISSION_SIZE_LIMIT
+from transport import TRANSPORTS, make_transport
+
+# round trips per transport, each one a runner sized frame out and the same frame echoed back
+ROUND_TRIPS = 20000
+# a port outside the range the game uses so the benchmark can run next to a game
+PORT = PORT_START + 1000
+
+# echo every frame back until the client hangs up
+def echo(name, ready):
+    transport = make_transport(name)
+    listener = transport.listen(PORT)
+    ready.set()
+    conn, _ = transport.accept(listener, RUNNER_TRANSMISSION_SIZE_LIMIT)
+    while True:
+        frame = conn.recv()
+        if not frame:
+            break
+        conn.send(frame)
+    conn.close()
+    listener.close()
+
+# returns the round trip times in seconds
+def ping_pong(name, round_trips):
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target = echo, args = (name, ready))
+    server.start()
+    ready.wait()
+    conn = make_transport(name).connect(PORT, RUNNER_TRANSMISSION_SIZE_LIMIT)
+    payload = bytes(RUNNER_TRANSMISSION_SIZE_LIMIT)
+    times = np.empty(round_trips)
+    for i in range(round_trips):
+        start = time.perf_counter()
+        conn.send(payload)
+        conn.recv()
+        times[i] = time.perf_counter() - start
+    conn.close()
+    server.join()
+    return times
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or TRANSPORTS
+    print(f"{'transport':>10} {'median (us)':>12} {'p99 (us)':>9} {'round trips/s':>14}")
+    for name in names:
+        times = ping_pong(name, ROUND_TRIPS)
+        print(f"{name:>10} {np.median(times) * 1e6:>12.1f} {np.percentile(times, 99) * 1e6:>9.1f}"
+              f" {len(times) / times.sum():>14.0f}")
@@ -0,0 +1,123 @@
+import numpy as np
+
+# side length of the square chunks a ChunkedGrid is split into, a power of two so that finding
+# a cell's chunk is a shift and finding it within the chunk is a mask
+CHUNK_SHIFT = 6
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+# grids of maps with more cells than this are kept in chunks instead of dense arrays (see make_grid)
+DENSE_GRID_CELLS = 1 << 22
+
+# a map-sized grid for the given fill value and dtype: a plain array for maps that comfortably fit in memory
+# and a ChunkedGrid for bigger ones, so that each process only pays for the part of the map it has touched
+# both support the same indexing, so code that uses the grid doesn't need to know which one it got
+def make_grid(dims, fill, dtype):
+    if dims[0] * dims[1] <= DENSE_GRID_CELLS:
+        return np.full(dims, fill, dtype = dtype)
+    return ChunkedGrid(dims, fill, dtype)
+
+# 2d grid split into CHUNK_SIZE square chunks, where a chunk only takes up memory once it is written to
+# (or, given a generate function, once it is first looked at)
+# supports the indexing the game uses on its grids: grid[i, j] with ints for a single cell, with equal length
+# integer arrays (e.g. from np.nonzero) to gather or scatter many cells at once, and with slices to get a dense
+# copy of a window; np.asarray(grid) gives a dense copy of the whole thing
+class ChunkedGrid:
+    def __init__(self, dims, fill = 0, dtype = np.int8, generate = None):
+        self.shape = tuple(dims)
+        self.dtype = np.dtype(dtype)
+        self.fill = self.dtype.type(fill)
+        # generate(chunk_i, chunk_j, chunk_dims) returns the contents of a chunk the first time it is needed
+        self.generate = generate
+        self.chunk_cols = -(-self.shape[1] // CHUNK_SIZE)
+        self.chunks = dict()
+
+    # memory taken up by the chunks that exist so far
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    # chunk with the given flat chunk number, or None if nothing is in it yet and create is False
+    def chunk(self, number, create = False):
+        chunk = self.chunks.get(number)
+        if chunk is None and (create or self.generate is not None):
+            ci, cj = divmod(number, self.chunk_cols)
+            # chunks on the bottom and right edges are cut off at the edge of the map
+            dims = (min(CHUNK_SIZE, self.shape[0] - (ci << CHUNK_SHIFT)),
+                    min(CHUNK_SIZE, self.shape[1] - (cj << CHUNK_SHIFT)))
+            if self.generate is not None:
+                chunk = np.asarray(self.generate(ci, cj, dims), dtype = self.dtype)
+                assert chunk.shape == dims
+            else:
+                chunk = np.full(dims, self.fill, dtype = self.dtype)
+            self.chunks[number] = chunk
+        return chunk
+
+    def check_bounds(self, i, j):
+        if np.any(i < 0) or np.any(i >= self.shape[0]) or np.any(j < 0) or np.any(j >= self.shape[1]):
+            raise IndexError(f"index out of bounds for a grid of shape {self.shape}")
+
+    # group cells by chunk, yielding each chunk number with the positions of its cells in i and j
+    def split(self, i, j):
+        numbers = (i >> CHUNK_SHIFT) * self.chunk_cols + (j >> CHUNK_SHIFT)
+        if len(numbers) and (numbers == numbers[0]).all():
+            yield int(numbers[0]), slice(None)
+            return
+        order = np.argsort(numbers, kind = 'stable')
+        numbers = numbers[order]
+        starts = np.flatnonzero(np.diff(numbers, prepend = -1))
+        for start, end in zip(starts.tolist(), np.append(starts[1:], len(numbers)).tolist()):
+            yield int(numbers[start]), order[start:end]
+
+    def __getitem__(self, key):
+        i, j = key
+        if isinstance(i, slice) and isinstance(j, slice):
+            return self.window(i, j)
+        if np.ndim(i) == 0 and np.ndim(j) == 0:
+            self.check_bounds(i, j)
+            chunk = self.chunk((i >> CHUNK_SHIFT) * self.chunk_cols + (j >> CHUNK_SHIFT))
+            return self.fill if chunk is None else chunk[i & CHUNK_MASK, j & CHUNK_MASK]
+        i, j = np.broadcast_arrays(np.asarray(i, dtype = np.int64), np.asarray(j, dtype = np.int64))
+        self.check_bounds(i, j)
+        shape, i, j = i.shape, i.ravel(), j.ravel()
+        values = np.full(len(i), self.fill, dtype = self.dtype)
+        for number, where in self.split(i, j):
+            chunk = self.chunk(number)
+            if chunk is not None:
+                values[where] = chunk[i[where] & CHUNK_MASK, j[where] & CHUNK_MASK]
+        return values.reshape(shape)
+
+    def __setitem__(self, key, value):
+        i, j = key
+        if np.ndim(i) == 0 and np.ndim(j) == 0:
+            self.check_bounds(i, j)
+            chunk = self.chunk((i >> CHUNK_SHIFT) * self.chunk_cols + (j >> CHUNK_SHIFT), create = True)
+            chunk[i & CHUNK_MASK, j & CHUNK_MASK] = value
+            return
+        i, j = np.broadcast_arrays(np.asarray(i, dtype = np.int64), np.asarray(j, dtype = np.int64))
+        self.check_bounds(i, j)
+        value = np.broadcast_to(np.asarray(value, dtype = self.dtype), i.shape).ravel()
+        i, j = i.ravel(), j.ravel()
+        for number, where in self.split(i, j):
+            self.chunk(number, True)[i[where] & CHUNK_MASK, j[where] & CHUNK_MASK] = value[where]
+
+    # dense copy of the window covered by two slices, with cells of missing chunks set to the fill value
+    def window(self, rows, cols):
+        i0, i1, istep = rows.indices(self.shape[0])
+        j0, j1, jstep = cols.indices(self.shape[1])
+        assert istep == 1 and jstep == 1, "windows must be contiguous"
+        out = np.full((max(i1 - i0, 0), max(j1 - j0, 0)), self.fill, dtype = self.dtype)
+        for ci in range(i0 >> CHUNK_SHIFT, ((i1 - 1) >> CHUNK_SHIFT) + 1 if i1 > i0 else 0):
+            for cj in range(j0 >> CHUNK_SHIFT, ((j1 - 1) >> CHUNK_SHIFT) + 1 if j1 > j0 else 0):
+                chunk = self.chunk(ci * self.chunk_cols + cj)
+                if chunk is None:
+                    continue
+                # overlap of the window and the chunk, in map coordinates
+                top, left = ci << CHUNK_SHIFT, cj << CHUNK_SHIFT
+                a0, a1 = max(i0, top), min(i1, top + chunk.shape[0])
+                b0, b1 = max(j0, left), min(j1, left + chunk.shape[1])
+                out[a0 - i0:a1 - i0, b0 - j0:b1 - j0] = chunk[a0 - top:a1 - top, b0 - left:b1 - left]
+        return out
+
+    def __array__(self, dtype = None, copy = None):
+        dense = self.window(slice(None), slice(None))
+        return dense if dtype is None else dense.astype(dtype)
@@ -0,0 +1,195 @@
+import struct
+from collections import namedtuple
+import numpy as np
+
+# binary wire format shared by runners, relayers and the visualizer
+# every message starts with a 3 byte header: version (high nibble) | kind (low nibble), then a u16 sender/subject id
+# coordinates are u16 pairs and terrain codes are packed four to a byte
+CODEC_VERSION = 3
+HEADER = struct.Struct('<BH')
+
+# reports and advice carry a second fixed header: has_treasure (high bit) | number of locations,
+# number of animals, number of terrain cells
+# followed by treasure, locations, animals, terrain coordinates and finally the packed terrain codes
+REPORT_COUNTS = struct.Struct('<BBB')
+# frames for the visualizer start with the game clock tick they describe, since the visualizer may not get every one
+FRAME_TICK = struct.Struct('<I')
+# knowledge frames for the visualizer: has_treasure flag, number of runner locations, number of animals, and the
+# first row, number of rows and number of columns of the band of the knowledge map the frame carries
+# followed by treasure, runner locations, animals, a bitmap of known cells and the packed codes of the known cells
+FRAME_COUNTS = struct.Struct('<BHHHHH')
+
+KIND_RUNNER_REPORT = 0  # runner -> relayer: own location, treasure, animals, terrain
+KIND_RELAYER_REPORT = 1 # relayer -> relayer: runner locations, treasure, animals, terrain
+KIND_ADVICE = 2         # relayer -> runner: target (as the only location), treasure, animals, terrain
+KIND_TOO_FAR_AWAY = 3   # runner -> relayer heartbeat when out of range, echoed back by the relayer
+# every message between a runner and a relayer carries the runner's id, whichever way it goes, so that a runner host
+# (see host.py) can share one connection between many runners
+KIND_IM_DEAD = 4
+KIND_I_WON = 5
+KIND_WE_WON = 6
+# 7 is reserved: it was the visualizer's acknowledgement of a frame, which it no longer sends
+KIND_RUNNER_FRAME = 8   # runner -> visualizer: location
+KIND_RELAYER_FRAME = 9  # relayer -> visualizer: treasure, animals, runner locations and a band of the knowledge map
+KIND_HELLO = 10         # relayer -> relayer, first message on a new connection: the connecting relayer's id
+REPORT_KINDS = (KIND_RUNNER_REPORT, KIND_RELAYER_REPORT, KIND_ADVICE)
+
+COORD_SIZE = 4 # two u16s
+MAX_REPORT_ITEMS = 127 # locations share a byte with the treasure flag
+MAX_REPORT_TERRAIN = 255 # terrain cells are counted in a byte
+TREASURE_FLAG = 0x80
+# value used in decoded knowledge maps for cells nobody has seen yet (same as common.BLANK_INDEX)
+UNKNOWN_TERRAIN = -1
+
+# decoded message, fields that a kind doesn't carry are left empty
+# locations/animals are lists of (i, j) tuples, terrain is a pair of arrays (coords of shape (n, 2), codes of shape (n,))
+# for relayer frames, terrain is instead the pair (first row, knowledge map of the band of rows starting there)
+# tick is only set for visualizer frames
+Message = namedtuple('Message', ['kind', 'id', 'locations', 'treasure', 'animals', 'terrain', 'tick'])
+
+def encode_header(kind, id):
+    return HEADER.pack(CODEC_VERSION << 4 | kind, id)
+
+# message with no payload besides the header
+def encode_control(kind, id = 0):
+    return encode_header(kind, id)
+
+# pack terrain codes in [0, 3] four to a byte
+def pack_codes(codes):
+    codes = np.asarray(codes, dtype = np.uint8)
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype = np.uint8)
+    padded[:len(codes)] = codes
+    quads = padded.reshape(-1, 4)
+    return (quads[:, 0] | quads[:, 1] << 2 | quads[:, 2] << 4 | quads[:, 3] << 6).tobytes()
+
+def unpack_codes(data, n):
+    packed = np.frombuffer(data, dtype = np.uint8)
+    return ((packed[:, None] >> np.array([0, 2, 4, 6], dtype = np.uint8)) & 3).reshape(-1)[:n].astype(np.int8)
+
+def encode_coords(coords):
+    return np.asarray(coords, dtype = '<u2').reshape(-1, 2).tobytes()
+
+def decode_coords(data, offset, n):
+    coords = np.frombuffer(data, dtype = '<u2', count = 2 * n, offset = offset).reshape(n, 2)
+    return [tuple(c) for c in coords.tolist()], offset + n * COORD_SIZE
+
+# bytes needed for n terrain cells
+def terrain_size(n):
+    return n * COORD_SIZE + -(-n // 4)
+
+# most terrain cells that fit in budget bytes
+def terrain_capacity(budget):
+    n = max(0, (4 * budget) // (4 * COORD_SIZE + 1))
+    while n > 0 and terrain_size(n) > budget:
+        n -= 1
+    return min(n, MAX_REPORT_TERRAIN)
+
+# encode a report or advice message, filling the byte budget in priority order:
+# treasure, locations, animals and then terrain cells in the order given
+# returns the message and the number of animals and terrain cells that made it in
+def encode_report(kind, id, locations, treasure, animals, terrain_coords, terrain_codes, limit):
+    assert kind in REPORT_KINDS
+    budget = limit - HEADER.size - REPORT_COUNTS.size
+    if treasure is not None:
+        budget -= COORD_SIZE
+    locations = list(locations)[:min(budget // COORD_SIZE, MAX_REPORT_ITEMS)]
+    budget -= len(locations) * COORD_SIZE
+    animals = list(animals)[:min(budget // COORD_SIZE, 255)]
+    budget -= len(animals) * COORD_SIZE
+    n_terrain = min(len(terrain_codes), terrain_capacity(budget))
+
+    flags = (TREASURE_FLAG if treasure is not None else 0) | len(locations)
+    parts = [encode_header(kind, id), REPORT_COUNTS.pack(flags, len(animals), n_terrain)]
+    if treasure is not None:
+        parts.append(encode_coords(treasure))
+    parts.append(encode_coords(locations))
+    parts.append(encode_coords(animals))
+    parts.append(encode_coords(terrain_coords[:n_terrain]))
+    parts.append(pack_codes(terrain_codes[:n_terrain]))
+    message = b''.join(parts)
+    assert len(message) <= limit
+    return message, len(animals), n_terrain
+
+# encode the runner's position update for the visualizer
+def encode_runner_frame(id, tick, location):
+    return encode_header(KIND_RUNNER_FRAME, id) + FRAME_TICK.pack(tick) + encode_coords(location)
+
+# encode a relayer's state for the visualizer, with the band of its terrain map that starts at first_row
+# knowledge is that band of the relayer's terrain map, negative values are cells it hasn't seen
+def encode_relayer_frame(id, tick, treasure, animals, knowledge, runner_locations, first_row = 0):
+    animals, runner_locations = list(animals), list(runner_locations)
+    known = knowledge >= 0
+    parts = [encode_header(KIND_RELAYER_FRAME, id), FRAME_TICK.pack(tick),
+             FRAME_COUNTS.pack(treasure is not None, len(runner_locations), len(animals), first_row, *knowledge.shape)]
+    if treasure is not None:
+        parts.append(encode_coords(treasure))
+    parts.extend([encode_coords(runner_locations), encode_coords(animals),
+                  np.packbits(known).tobytes(), pack_codes(knowledge[known])])
+    return b''.join(parts)
+
+# rows of a map with the given number of columns that always fit in a relayer frame of at most limit bytes,
+# next to the treasure, num_runners runner locations and num_animals animals, however much of them is known
+# (a row's bitmap and codes take three bits per cell, plus up to a byte each for rounding)
+def relayer_frame_rows(cols, num_runners, num_animals, limit):
+    fixed = HEADER.size + FRAME_TICK.size + FRAME_COUNTS.size + COORD_SIZE * (1 + num_runners + num_animals)
+    return max(1, (8 * (limit - fixed - 2)) // (3 * cols))
+
+# kind of an encoded message, without decoding the rest of it
+def message_kind(data):
+    return data[0] & 0xF
+
+# sender/subject id of an encoded message, without decoding the rest of it
+def message_id(data):
+    return HEADER.unpack_from(data)[1]
+
+def decode(data):
+    data = bytes(data)
+    if len(data) < HEADER.size:
+        raise ValueError(f"Message too short: {data}")
+    version_kind, id = HEADER.unpack_from(data)
+    version, kind = version_kind >> 4, version_kind & 0xF
+    if version != CODEC_VERSION:
+        raise ValueError(f"Unsupported codec version {version}")
+    offset = HEADER.size
+    locations, treasure, animals, terrain, tick = [], None, [], None, None
+
+    if kind in REPORT_KINDS:
+        flags, n_animals, n_terrain = REPORT_COUNTS.unpack_from(data, offset)
+        offset += REPORT_COUNTS.size
+        if flags & TREASURE_FLAG:
+            (treasure,), offset = decode_coords(data, offset, 1)
+        locations, offset = decode_coords(data, offset, flags & MAX_REPORT_ITEMS)
+        animals, offset = decode_coords(data, offset, n_animals)
+        coords = np.frombuffer(data, dtype = '<u2', count = 2 * n_terrain, offset = offset).reshape(n_terrain, 2)
+        offset += n_terrain * COORD_SIZE
+        n_packed = -(-n_terrain // 4)
+        terrain = (coords.astype(np.int64), unpack_codes(data[offset:offset + n_packed], n_terrain))
+        offset += n_packed
+    elif kind == KIND_RUNNER_FRAME:
+        (tick,) = FRAME_TICK.unpack_from(data, offset)
+        locations, offset = decode_coords(data, offset + FRAME_TICK.size, 1)
+    elif kind == KIND_RELAYER_FRAME:
+        (tick,) = FRAME_TICK.unpack_from(data, offset)
+        offset += FRAME_TICK.size
+        has_treasure, n_runners, n_animals, first_row, rows, cols = FRAME_COUNTS.unpack_from(data, offset)
+        offset += FRAME_COUNTS.size
+        if has_treasure:
+            (treasure,), offset = decode_coords(data, offset, 1)
+        locations, offset = decode_coords(data, offset, n_runners)
+        animals, offset = decode_coords(data, offset, n_animals)
+        n_bitmap = -(-rows * cols // 8)
+        known = np.unpackbits(np.frombuffer(data, dtype = np.uint8, count = n_bitmap, offset = offset),
+                              count = rows * cols).astype(bool)
+        offset += n_bitmap
+        n_known = int(known.sum())
+        n_packed = -(-n_known // 4)
+        terrain = np.full(rows * cols, UNKNOWN_TERRAIN, dtype = np.int8)
+        terrain[known] = unpack_codes(data[offset:offset + n_packed], n_known)
+        terrain = (first_row, terrain.reshape(rows, cols))
+        offset += n_packed
+    elif kind > KIND_HELLO:
+        raise ValueError(f"Unknown message kind {kind}")
+
+    if offset != len(data):
+        raise ValueError(f"Message of kind {kind} has {len(data) - offset} unexpected trailing bytes")
+    return Message(kind, id, locations, treasure, animals, terrain, tick)
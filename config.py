@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+from collections import namedtuple
+
+# everything besides the seed that every process in a game has to agree on
+# spawn.py hands its configuration to every child through the ADELPHON_CONFIG environment variable,
+# and each process applies it (see apply_config) before it builds anything
+RunConfig = namedtuple('RunConfig', ['num_runners', 'num_relayers', 'num_animals', 'map_dimensions', 'comm_radius',
+                                     'port_start'])
+CONFIG_ENV = 'ADELPHON_CONFIG'
+# module constant that each field sets
+CONFIG_CONSTANTS = dict(num_runners = 'NUM_RUNNERS', num_relayers = 'NUM_RELAYERS', num_animals = 'NUM_ANIMALS',
+                        map_dimensions = 'MAP_DIMENSIONS', comm_radius = 'COMM_RADIUS', port_start = 'PORT_START')
+# the constants are defined in common.py and game.py, and every star import (or from import) of them gives
+# the importing module its own copy, so setting them means setting every copy (see set_constants)
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+# coordinates, ids and map sides all go over the wire as u16s (see codec.py)
+MAX_WIRE_VALUE = (1 << 16) - 1
+# the spawn and visualizer ports sit just below PORT_START, and nothing below here should be used
+MIN_PORT = 1024
+
+# the configuration the modules are currently set up with
+def current_config():
+    import common, game
+    return RunConfig(num_runners = game.NUM_RUNNERS, num_relayers = game.NUM_RELAYERS, num_animals = game.NUM_ANIMALS,
+                     map_dimensions = tuple(common.MAP_DIMENSIONS), comm_radius = game.COMM_RADIUS,
+                     port_start = common.PORT_START)
+
+# raise a ValueError describing the first thing wrong with config, or return it as is
+def validate_config(config):
+    if not 1 <= config.num_runners <= MAX_WIRE_VALUE:
+        raise ValueError(f"num_runners must be between 1 and {MAX_WIRE_VALUE}, got {config.num_runners}")
+    if not 1 <= config.num_relayers <= MAX_WIRE_VALUE:
+        raise ValueError(f"num_relayers must be between 1 and {MAX_WIRE_VALUE}, got {config.num_relayers}")
+    if config.num_animals < 0:
+        raise ValueError(f"num_animals can't be negative, got {config.num_animals}")
+    rows, cols = config.map_dimensions
+    if not (1 <= rows <= MAX_WIRE_VALUE and 1 <= cols <= MAX_WIRE_VALUE):
+        raise ValueError(f"map sides must be between 1 and {MAX_WIRE_VALUE}, got {rows}x{cols}")
+    # relayers are spread over a square grid laid over the map (see Game.relayer_init)
+    if not 0.8 <= rows / cols <= 1.2:
+        raise ValueError(f"the map must be close to square, got {rows}x{cols}")
+    import game
+    if not game.relayer_grid_fits(config.map_dimensions, config.num_relayers):
+        raise ValueError(f"{config.num_relayers} relayers don't fit on a {rows}x{cols} map, "
+                         f"use fewer relayers or a bigger map")
+    if config.comm_radius <= 0:
+        raise ValueError(f"comm_radius must be positive, got {config.comm_radius}")
+    # relayers listen on PORT_START + id for runners and PORT_START + num_relayers + id for other relayers
+    last_port = config.port_start + 2 * config.num_relayers - 1
+    if config.port_start - 2 < MIN_PORT or last_port > MAX_WIRE_VALUE:
+        raise ValueError(f"ports {config.port_start - 2} to {last_port} don't fit between {MIN_PORT} and "
+                         f"{MAX_WIRE_VALUE}, move port_start")
+    return config
+
+# every loaded module of the game, i.e. every module from a file in this repo (including benchmarks and tests,
+# and whichever of them was run as a script, which is __main__ rather than its own name)
+# modules imported later take their copies from common and game, which are always loaded by then
+def game_modules():
+    import common, game
+    modules = dict()
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if path is not None and os.path.abspath(path).startswith(REPO_ROOT + os.sep):
+            # the same module can be loaded under two names, e.g. __main__ and __mp_main__
+            modules[id(module)] = module
+    return list(modules.values())
+
+# point every module's copy of the given constants at the given values
+def set_constants(constants):
+    for module in game_modules():
+        for constant, value in constants.items():
+            if hasattr(module, constant):
+                setattr(module, constant, value)
+
+# set every module up for config, including the ports that are laid out relative to PORT_START
+def apply_config(config):
+    validate_config(config)
+    constants = {CONFIG_CONSTANTS[field]: value for field, value in config._asdict().items()}
+    constants.update(VISUALIZER_PORT = config.port_start - 1, SPAWN_PORT = config.port_start - 2)
+    set_constants(constants)
+
+def config_to_json(config):
+    return json.dumps(config._asdict())
+
+def config_from_json(text):
+    fields = json.loads(text)
+    fields['map_dimensions'] = tuple(fields['map_dimensions'])
+    return validate_config(RunConfig(**fields))
+
+# the configuration spawn.py passed to this process, or the modules' own if it was started some other way
+def load_config():
+    text = os.environ.get(CONFIG_ENV)
+    return current_config() if text is None else config_from_json(text)
+
+# environment for a child process that should play with config
+def config_env(config):
+    return dict(os.environ, **{CONFIG_ENV: config_to_json(config)})
+
+# command line flags for every field, defaulting to the current configuration
+def add_config_arguments(parser):
+    defaults = current_config()
+    group = parser.add_argument_group("run configuration")
+    group.add_argument('--runners', type = int, default = defaults.num_runners)
+    group.add_argument('--relayers', type = int, default = defaults.num_relayers)
+    group.add_argument('--animals', type = int, default = defaults.num_animals)
+    group.add_argument('--map-size', type = parse_dimensions, default = defaults.map_dimensions, metavar = 'ROWSxCOLS',
+                       help = f"map dimensions, or a single side length for a square map "
+                              f"(default {defaults.map_dimensions[0]}x{defaults.map_dimensions[1]})")
+    group.add_argument('--comm-radius', type = int, default = defaults.comm_radius)
+    group.add_argument('--port-start', type = int, default = defaults.port_start,
+                       help = "first relayer port, the spawn and visualizer ports are the two below it")
+
+def config_from_args(args):
+    return validate_config(RunConfig(num_runners = args.runners, num_relayers = args.relayers,
+                                     num_animals = args.animals, map_dimensions = args.map_size,
+                                     comm_radius = args.comm_radius, port_start = args.port_start))
+
+# '200' or '200x180'
+def parse_dimensions(text):
+    sides = [int(side) for side in text.lower().split('x')]
+    if len(sides) == 1:
+        sides *= 2
+    if len(sides) != 2:
+        raise ValueError(f"expected ROWSxCOLS, got {text}")
+    return tuple(sides)
@@ -0,0 +1,155 @@
+import argparse
+import time
+from collections import deque, namedtuple
+
+from game import *
+from common import *
+from relayer import Relayer
+from runner import Runner
+from tracelog import TraceWriter, ROLE_RUNNER, ROLE_RELAYER
+from config import add_config_arguments, config_from_args, apply_config
+
+GameResult = namedtuple('GameResult', ['seed', 'won', 'ticks', 'deaths', 'messages', 'bytes', 'wall_time'])
+
+# in-memory stand-in for one end of a framed connection (see framing.py)
+# each frame sent is delivered as one message to the peer, and frames over the size limit are rejected
+class Endpoint:
+    def __init__(self, bus, owner, max_frame_size):
+        self.bus = bus
+        self.owner = owner
+        self.max_frame_size = max_frame_size
+        self.peer = None
+        self.inbox = deque()
+
+    def send(self, payload):
+        self.send_frames([payload])
+
+    def send_frames(self, payloads):
+        for payload in payloads:
+            if len(payload) > self.max_frame_size:
+                raise ValueError(f"Frame of {len(payload)} bytes is over the limit of {self.max_frame_size}")
+            self.bus.messages += 1
+            self.bus.bytes += len(payload)
+            if self.bus.log is not None:
+                self.bus.log.append((message_kind(payload), role(self.owner), self.owner.id,
+                                     role(self.peer.owner), self.peer.owner.id, len(payload)))
+            self.peer.inbox.append(bytes(payload))
+            # messages for relayers are handed over by the bus, runners read their own inbox when planning
+            if isinstance(self.peer.owner, Relayer):
+                self.bus.deliveries.append(self.peer)
+
+    def recv(self):
+        return self.inbox.popleft() if self.inbox else b''
+
+    def recv_frames(self):
+        frames = list(self.inbox)
+        self.inbox.clear()
+        return frames
+
+    def close(self):
+        pass
+
+# trace role of a runner or relayer
+def role(agent):
+    return ROLE_RELAYER if isinstance(agent, Relayer) else ROLE_RUNNER
+
+# connects runners and relayers through in-memory endpoints and counts the traffic between them
+class MessageBus:
+    def __init__(self):
+        self.deliveries = deque()
+        self.messages = 0
+        self.bytes = 0
+        # every message sent since the last time it was emptied, only kept while a trace is being written
+        self.log = None
+
+    # create a connected pair of endpoints, the first owned by a and the second by b
+    def pair(self, a, b, max_frame_size):
+        end_a, end_b = Endpoint(self, a, max_frame_size), Endpoint(self, b, max_frame_size)
+        end_a.peer, end_b.peer = end_b, end_a
+        return end_a, end_b
+
+    # hand queued messages to relayers in the order they were sent until nothing is left in flight
+    def pump(self):
+        while self.deliveries:
+            endpoint = self.deliveries.popleft()
+            relayer = endpoint.owner
+            if relayer.game_over or not endpoint.inbox:
+                continue
+            relayer.handle_data(endpoint, endpoint.recv())
+            if endpoint.inbox:
+                self.deliveries.append(endpoint)
+
+# runs a whole game (every runner and relayer) in one process in lock-step tick order
+# the agents are the same classes used by spawn.py, so a seed plays out the same way it does across processes
+# relayers keep their own game instances, runners share one like the runners of a host (see host.py)
+# pass trace (a directory) to record the game there as it is played, see tracelog.py and replay.py
+class HeadlessGame:
+    def __init__(self, seed, trace = None):
+        self.seed = seed
+        self.bus = MessageBus()
+        self.ticks = 0
+        self.trace = None
+        if trace is not None:
+            self.trace = TraceWriter(trace, seed)
+            self.bus.log = []
+        self.game_instance = Game(seed)
+        self.relayers = [Relayer(seed, i, headless = True) for i in range(NUM_RELAYERS)]
+        self.runners = [Runner(seed, i, headless = True, host = self) for i in range(NUM_RUNNERS)]
+        # mirror the socket layout: relayers are connected to the relayers their sync topology pairs them with,
+        # runners connect to every relayer
+        for relayer in self.relayers:
+            for peer in relayer.topology.neighbors(relayer.id):
+                if peer < relayer.id:
+                    lower = self.relayers[peer]
+                    end, lower_end = self.bus.pair(relayer, lower, RELAYER_TRANSMISSION_SIZE_LIMIT)
+                    relayer.relayer_sockets[peer] = end
+                    lower.relayer_sockets[relayer.id] = lower_end
+        for runner in self.runners:
+            for relayer in self.relayers:
+                end, relayer_end = self.bus.pair(runner, relayer, RUNNER_TRANSMISSION_SIZE_LIMIT)
+                runner.sockets.append(end)
+                relayer.runner_connections[runner.id] = relayer_end
+
+    def active_runners(self):
+        return [r for r in self.runners if r.alive and not r.won and not r.game_over]
+
+    def finished(self):
+        return not self.active_runners() or all(relayer.game_over for relayer in self.relayers)
+
+    # one lock-step timestep: every runner reports, the relayers sync, then every runner plans
+    def tick(self):
+        runners = self.active_runners()
+        states = self.game_instance.query_many([runner.move() for runner in runners], is_runner = True)
+        for runner, state in zip(runners, states):
+            runner.report(state)
+        self.bus.pump()
+        for runner in runners:
+            if runner.alive and not runner.won:
+                runner.plan()
+        if self.trace is not None:
+            self.trace.record_tick(runners, self.relayers, self.bus.log)
+            self.bus.log.clear()
+        self.ticks += 1
+
+    def run(self, max_ticks = None):
+        start = time.perf_counter()
+        while not self.finished() and (max_ticks is None or self.ticks < max_ticks):
+            self.tick()
+        if self.trace is not None:
+            self.trace.close()
+        return GameResult(seed = self.seed, won = any(runner.won for runner in self.runners), ticks = self.ticks,
+                          deaths = sum(not runner.alive for runner in self.runners), messages = self.bus.messages,
+                          bytes = self.bus.bytes, wall_time = time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Play a whole game of Adelphon in one process")
+    parser.add_argument('seed', type = int)
+    parser.add_argument('max_ticks', type = int, nargs = '?')
+    parser.add_argument('--trace', metavar = 'DIR', help = "record the game to a trace in DIR (see replay.py)")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    try:
+        apply_config(config_from_args(args))
+    except ValueError as e:
+        parser.error(str(e))
+    print(HeadlessGame(args.seed, args.trace).run(args.max_ticks))
@@ -0,0 +1,98 @@
+import struct
+import select
+from collections import deque
+
+# every frame on a stream socket is a u32 payload length followed by the payload
+FRAME_HEADER = struct.Struct('<I')
+# how much to ask the kernel for on each read, enough for many small frames at once
+RECV_SIZE = 65536
+
+# wraps a connected stream socket so that one send always arrives as exactly one message,
+# no matter how TCP coalesces or splits the bytes in between
+# frames larger than max_frame_size are a protocol error on both the sending and receiving side
+class FramedSocket:
+    def __init__(self, sock, max_frame_size):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+        self.frames = deque()
+
+    # lets selectors watch the wrapped socket directly
+    def fileno(self):
+        return self.sock.fileno()
+
+    def setblocking(self, flag):
+        self.sock.setblocking(flag)
+
+    def close(self):
+        self.sock.close()
+
+    def send(self, payload):
+        self.send_frames([payload])
+
+    # send several frames to this peer with a single sendmsg (writev) call where possible
+    def send_frames(self, payloads):
+        buffers = []
+        for payload in payloads:
+            if len(payload) > self.max_frame_size:
+                raise ValueError(f"Frame of {len(payload)} bytes is over the limit of {self.max_frame_size}")
+            buffers.append(FRAME_HEADER.pack(len(payload)))
+            buffers.append(payload)
+        total = sum(len(b) for b in buffers)
+        sent = self.sendmsg(buffers)
+        # the kernel buffer filled up part way through, so push the rest out the slow way
+        if sent < total:
+            remaining = memoryview(b''.join(buffers))[sent:]
+            while remaining:
+                remaining = remaining[self.sendmsg([remaining]):]
+
+    # sendmsg that waits for the socket to become writable instead of failing on non-blocking sockets
+    def sendmsg(self, buffers):
+        while True:
+            try:
+                return self.sock.sendmsg(buffers)
+            except BlockingIOError:
+                select.select([], [self.sock], [])
+
+    # read whatever is available with one recv call and return every complete frame received so far
+    # returns None once the peer has closed the connection
+    def recv_frames(self):
+        data = self.sock.recv(RECV_SIZE)
+        if not data:
+            return None
+        self.buffer += data
+        self.split_frames()
+        frames = list(self.frames)
+        self.frames.clear()
+        return frames
+
+    # blocking read of the next single frame, returns b'' once the peer has closed the connection
+    def recv(self):
+        while not self.frames:
+            data = self.sock.recv(RECV_SIZE)
+            if not data:
+                return b''
+            self.buffer += data
+            self.split_frames()
+        return self.frames.popleft()
+
+    # frames that have already been read off the socket but not returned yet, e.g. ones that came in along with
+    # a frame read by recv, which a selector waiting on the socket won't report
+    def buffered_frames(self):
+        frames = list(self.frames)
+        self.frames.clear()
+        return frames
+
+    # move every complete frame out of the read buffer
+    def split_frames(self):
+        offset = 0
+        while len(self.buffer) - offset >= FRAME_HEADER.size:
+            (size,) = FRAME_HEADER.unpack_from(self.buffer, offset)
+            if size > self.max_frame_size:
+                raise ValueError(f"Incoming frame of {size} bytes is over the limit of {self.max_frame_size}")
+            end = offset + FRAME_HEADER.size + size
+            if end > len(self.buffer):
+                break
+            self.frames.append(bytes(self.buffer[offset + FRAME_HEADER.size:end]))
+            offset = end
+        del self.buffer[:offset]
@@ -3,6 +3,11 @@ from enum import Enum
 import numpy as np
 
 from common import *
+from chunks import ChunkedGrid, CHUNK_SIZE
+from spatial import SpatialHash
+from geometry import world_geometry, in_disk
+from world import WorldSnapshot, world_path, load_world, save_world
+from world import CheckpointStore, checkpoint_path, CHECKPOINT_INTERVAL
 
 
 NUM_ANIMALS = 5
@@ -35,6 +40,8 @@ WAIT_TIME_MAP = {
 }
 
 WAIT_TIME_MAP_INVERSE = {v:k for k,v in WAIT_TIME_MAP.items()}
+# wait time of each terrain code
+WAIT_TIMES = np.array([WAIT_TIME_MAP[terrain] for terrain in Terrain])
 
 TERRAIN_COLOR_MAP = OrderedDict([
     (Terrain.FLAT_GROUND, convert_color([14, 87, 20])),
@@ -50,124 +57,352 @@ assert set(WAIT_TIME_MAP.keys()) == set(Terrain) and set(TERRAIN_COLOR_MAP.keys(
 
 MAINTAIN_TERRAIN_TYPE_PROB = 0.7
 
+# 'classic' generates terrain one cell at a time
+# 'fast' generates whole anti-diagonals at once, so the same seed gives a different map
+# 'chunked' generates each CHUNK_SIZE square of the map on its own the first time anything in it is looked at,
+#  like 'fast' but without the squares depending on each other, so the whole map never has to exist at once
+#  (meant for maps far bigger than the default, the terrain shows seams along chunk edges)
+TERRAIN_MODES = ('classic', 'fast', 'chunked')
+TERRAIN_MODE = 'classic'
+assert TERRAIN_MODE in TERRAIN_MODES
+
+# independent streams of randomness (see game_rng), so adding, removing or reordering the draws in one
+# never changes what another one draws
+WORLD_STREAM = 0   # starting positions of everything
+TERRAIN_STREAM = 1
+ANIMAL_STREAM = 2  # animal moves, one generator per game clock tick
+TERRAIN_CHUNK_STREAM = 3  # 'chunked' terrain, one generator per chunk
+# runner i makes its own decisions from stream RUNNER_STREAM + i
+RUNNER_STREAM = 1 << 16
+
+# counter-based generator for one stream at one game clock tick
+# a Philox generator is fully determined by its key and counter, so every process builds the exact same one from
+# (seed, clock, stream) without sharing or replaying any state, and the stream and clock sit in the high words of
+# the counter so their draws never run into each other
+def game_rng(seed, clock, stream):
+    return np.random.Generator(np.random.Philox(key = seed, counter = [0, 0, clock, stream]))
+
+# the same generators as game_rng, but reusing one Philox instance and just moving its counter, since building
+# a new one costs more than everything drawn from it in a timestep
+# each call to at() resets the one generator it hands out, so finish with one before asking for the next
+class CounterRNG:
+    def __init__(self, seed):
+        self.bit_generator = np.random.Philox(key = seed)
+        self.generator = np.random.Generator(self.bit_generator)
+        self.state = self.bit_generator.state
+
+    def at(self, clock, stream):
+        self.state['state']['counter'][:] = (0, 0, clock, stream)
+        self.bit_generator.state = self.state
+        return self.generator
+
 GameState = namedtuple('GameState', ['alive', 'won', 'wait_time', 'local_view'])
 LocalView = namedtuple("LocalView", ['terrain', 'animals', 'treasure'])
 
 class Game:
-    def __init__(self, seed):
+    def __init__(self, seed, terrain_mode = None):
         self.starting_seed = seed
         self.game_clock = 0
-        np.random.seed(self.starting_seed + self.game_clock)
-        self.relayer_locations = self.relayer_init()
-        self.runner_start_locations = [self.random_coord_helper() for _ in range(NUM_RUNNERS)]
-        self.animal_locations = tuple(self.random_coord_helper() for _ in range(NUM_ANIMALS))
-        self.animal_movements = tuple(self.random_movement_helper() for _ in range(NUM_ANIMALS))
-        self.treasure = self.random_coord_helper()
-        self.terrain = self.generate_terrain_grid()
-        self.coords = generate_coord_grid()
+        self.random = CounterRNG(seed)
+        self.terrain_mode = TERRAIN_MODE if terrain_mode is None else terrain_mode
+        assert self.terrain_mode in TERRAIN_MODES, f"invalid terrain mode: {self.terrain_mode}"
+        # the static world only depends on the seed, so build it once and share it through the cache
+        path = world_path(seed, self.world_params())
+        world = load_world(path)
+        if world is None:
+            world = save_world(path, self.generate_world())
+        self.checkpoints = CheckpointStore(checkpoint_path(path, self.dynamics_params()))
+        self.attach(world)
+
+    # every parameter that affects the static world, used as part of the cache key
+    def world_params(self):
+        return dict(terrain_mode = self.terrain_mode, map_dimensions = MAP_DIMENSIONS, num_relayers = NUM_RELAYERS, 
+                    num_runners = NUM_RUNNERS, num_animals = NUM_ANIMALS, animal_range = ANIMAL_RANGE, 
+                    relayer_grid_center_ratio = RELAYER_GRID_CENTER_RATIO, 
+                    terrain_probabilities = tuple(TERRAIN_PROBABILITIES), 
+                    maintain_terrain_type_prob = MAINTAIN_TERRAIN_TYPE_PROB, chunk_size = CHUNK_SIZE)
+
+    # every parameter besides the world that affects how animals move, used as part of the checkpoint key
+    def dynamics_params(self):
+        return dict(animal_stagnate_prob = ANIMAL_STAGNATE_PROB, animal_direction_change_prob = ANIMAL_DIRECTION_CHANGE_PROB)
+
+    # generate the static world from scratch
+    def generate_world(self):
+        rng = game_rng(self.starting_seed, 0, WORLD_STREAM)
+        relayer_locations = self.relayer_init(rng)
+        runner_start_locations = [self.random_coord_helper(rng) for _ in range(NUM_RUNNERS)]
+        animal_locations = [self.random_coord_helper(rng) for _ in range(NUM_ANIMALS)]
+        animal_movements = [self.random_movement_helper(rng) for _ in range(NUM_ANIMALS)]
+        treasure = self.random_coord_helper(rng)
+        # chunked terrain is never stored, every process generates the chunks it needs (see attach)
+        terrain = self.generate_terrain_grid() if self.terrain_mode != 'chunked' else np.empty((0, 0), dtype = np.int8)
+        positions = [np.array(p, dtype = np.int64).reshape(-1, 2) for p in 
+                     (relayer_locations, runner_start_locations, animal_locations, animal_movements)]
+        return WorldSnapshot(terrain, *positions, np.array(treasure, dtype = np.int64))
+
+    # set up this game instance from a (possibly read-only, memory-mapped) world snapshot
+    def attach(self, world):
+        to_tuples = lambda array: [tuple(loc) for loc in array.tolist()]
+        self.terrain = world.terrain
+        if self.terrain_mode == 'chunked':
+            self.terrain = ChunkedGrid(MAP_DIMENSIONS, dtype = np.int8, generate = self.generate_terrain_chunk)
+        self.relayer_locations = to_tuples(world.relayer_locations)
+        self.runner_start_locations = to_tuples(world.runner_start_locations)
+        self.geometry = world_geometry(tuple(self.relayer_locations), tuple(MAP_DIMENSIONS), COMM_RADIUS)
+        # animals move as arrays, with each one's current movement as an index into every possible movement
+        self.animal_directions = np.array([(di, dj) for di in range(-ANIMAL_RANGE, ANIMAL_RANGE + 1)
+                                           for dj in range(-ANIMAL_RANGE, ANIMAL_RANGE + 1)])
+        side = 2 * ANIMAL_RANGE + 1
+        headings = (world.animal_movements[:, 0] + ANIMAL_RANGE) * side + world.animal_movements[:, 1] + ANIMAL_RANGE
+        self.initial_animal_state = np.column_stack([world.animal_locations, headings]).astype(np.int64)
+        self.animal_state = self.initial_animal_state
+        # animals bucketed by location, big enough buckets that every animal a player can see or be killed by is in
+        # the buckets around it, so looking at the game costs the same however many animals are elsewhere on the map
+        self.animal_hash = SpatialHash(world.animal_locations, max(ANIMAL_RADIUS, KILL_RADIUS, 1), MAP_DIMENSIONS)
+        self.map_limits = np.array(MAP_DIMENSIONS)
+        self.treasure = tuple(world.treasure.tolist())
         runner_start_terrains = [Terrain(self.terrain[loc]) for loc in self.runner_start_locations]
         self.runner_start_wait_times = [WAIT_TIME_MAP[terrain] for terrain in runner_start_terrains]
 
-    def query(self, location, is_runner):
-        # reseed so all processes running the game have same source of randomness
+    # generator for this game clock tick's draws from one stream
+    def rng(self, stream):
+        return self.random.at(self.game_clock, stream)
+
+    # advance the game by one timestep
+    def step(self):
         self.game_clock += 1
-        np.random.seed(self.starting_seed + self.game_clock)
         # update animals on every timestep
         self.update_animals()
-        # only runners can find treasure or get killed by animals
-        if is_runner:
-            if location == self.treasure:
-                return GameState(alive = True, won = True, wait_time = 0, local_view = None)  # treasure found and game won
 
-            for animal_location in self.animal_locations:
-                # death (killed by an animal)
-                if distance(location, animal_location) <= KILL_RADIUS:
-                    return GameState(alive = False, won = False, wait_time = 0, local_view = None)
+    # advance the game by one timestep and tell the player at location what it sees
+    def query(self, location, is_runner):
+        self.step()
+        return self.observe(location, is_runner)
+
+    # advance the game by one timestep and tell the players at each of locations what they see
+    def query_many(self, locations, is_runner):
+        self.step()
+        return self.observe_many(locations, is_runner)
+
+    # what the player at location sees at the current timestep, without advancing the game
+    def observe(self, location, is_runner):
+        return self.observe_many([location], is_runner)[0]
+
+    # what the players at each of locations see at the current timestep, as a list of GameStates in the same order
+    # the treasure, kill, animal and wait time checks are done for every location at once, so a runner host
+    # (see host.py) or the engine steps one game instance per timestep and looks at it once for all of its runners
+    def observe_many(self, locations, is_runner):
+        locations = np.asarray(locations, dtype = np.int64).reshape(-1, 2)
+        # offset of every animal in the buckets around each location from that location
+        near_location, near_animal = self.animal_hash.candidates(locations)
+        animal_offsets = self.animal_state[near_animal, :2] - locations[near_location]
+        treasure_offsets = np.asarray(self.treasure) - locations
+        # only runners can find treasure or get killed by animals
+        won = np.full(len(locations), is_runner) & (treasure_offsets == 0).all(axis = 1)
+        killed = np.zeros(len(locations), dtype = bool)
+        killed[near_location[in_disk(animal_offsets, KILL_RADIUS)]] = True
+        dead = np.full(len(locations), is_runner) & ~won & killed
+        # locations of the animals each location sees, as seen[bounds[k]:bounds[k + 1]] for location k
+        nearby = in_disk(animal_offsets, ANIMAL_RADIUS)
+        bounds = np.searchsorted(near_location[nearby], np.arange(len(locations) + 1)).tolist()
+        seen = list(map(tuple, self.animal_state[near_animal[nearby], :2].tolist()))
+        sees_treasure = in_disk(treasure_offsets, TREASURE_RADIUS)
+        wait_times = WAIT_TIMES[self.terrain[locations[:, 0], locations[:, 1]]]
 
         # any other outcome means you are still alive and get local_view
         # convention: animal_radius > terrain_radius >> treasure_radius
         # decision: radius for treasure and animals, surrounding blocks (box) for terrain
-
-        # give local terrain BOX with side length TERRAIN_RANGE
-        i, j = location
+        # coordinates of every location's whole box, cut down to the part inside the map for each view
         half = TERRAIN_RANGE // 2
-        local_terrain = self.terrain[max(0, i - half) : i + half + 1, max(0, j - half) : j + half + 1]
-        local_coords = self.coords[max(0, i - half) : i + half + 1, max(0, j - half) : j + half + 1]
-        local_animals = [animal for animal in self.animal_locations if distance(animal, location) <= ANIMAL_RADIUS]
-        local_treasure = self.treasure if (distance(location, self.treasure) <= TREASURE_RADIUS) else None
+        box = np.arange(-half, half + 1)
+        coords = np.empty((len(locations), len(box), len(box), 2), dtype = np.int64)
+        coords[..., 0] = locations[:, 0, None, None] + box[None, :, None]
+        coords[..., 1] = locations[:, 1, None, None] + box[None, None, :]
+        corners = np.clip(np.concatenate([locations - half, locations + half + 1], axis = 1), 0,
+                          np.tile(MAP_DIMENSIONS, 2))
+        cuts = (corners - np.tile(locations - half, 2)).tolist()
+        states = []
+        for k, ((i0, j0, i1, j1), (a0, b0, a1, b1)) in enumerate(zip(corners.tolist(), cuts)):
+            if won[k]:
+                states.append(GameState(alive = True, won = True, wait_time = 0, local_view = None))
+                continue
+            if dead[k]:
+                states.append(GameState(alive = False, won = False, wait_time = 0, local_view = None))
+                continue
+            # give local terrain BOX with side length TERRAIN_RANGE
+            local_terrain = self.terrain[i0:i1, j0:j1]
+            local_coords = coords[k, a0:a1, b0:b1]
+            local_animals = seen[bounds[k]:bounds[k + 1]]
+            local_treasure = self.treasure if sees_treasure[k] else None
+            local_view = LocalView(terrain = (local_terrain, local_coords), animals = local_animals,
+                                   treasure = local_treasure)
+            states.append(GameState(alive = True, won = False, wait_time = int(wait_times[k]), local_view = local_view))
+        return states
 
-        local_view = LocalView(terrain = (local_terrain, local_coords), animals = local_animals, treasure = local_treasure)
-        current_terrain = Terrain(self.terrain[i, j])
-        return GameState(alive = True, won = False, wait_time = WAIT_TIME_MAP[current_terrain], local_view = local_view)
-
-    # update one animal's location and movement pattern
-    def update_single_animal(self, animal_loc, animal_movement):
+    # animal state once every animal has made its move for clock, from their state at clock - 1
+    # a state is an (n, 3) array of each animal's row, column and heading (an index into animal_directions)
+    # all processes running the game draw the same moves from the animal stream
+    def step_animals(self, state, clock):
+        rng = self.random.at(clock, ANIMAL_STREAM)
+        locations, headings = state[:, :2], state[:, 2].copy()
+        stagnate, turn, pick = rng.random((3, len(state)))
         # randomly stay in the same location with some probability
-        if np.random.rand() < ANIMAL_STAGNATE_PROB:
-            return animal_loc, animal_movement
-        # randomly change direction with some probability for the next move
-        new_dir = animal_movement
-        if np.random.rand() < ANIMAL_DIRECTION_CHANGE_PROB:
-            while new_dir == animal_movement:
-                new_dir = self.random_movement_helper()
-
-        # apply the movement based off current move tuple
-        new_loc = apply_move(animal_loc, new_dir)
-        # if not a valid move, update the movement pattern randomly and try again
-        while not is_valid_location(new_loc):
-            new_dir = tuple(-val for val in new_dir) # bounce off the edges of the map
-            new_loc = apply_move(animal_loc, new_dir)
-
-        return new_loc, new_dir
-
-    # apply updates to all animal's location and movement patterns
+        moving = stagnate >= ANIMAL_STAGNATE_PROB
+        # randomly change direction with some probability for the next move, to any of the other directions
+        turning = moving & (turn < ANIMAL_DIRECTION_CHANGE_PROB)
+        new = (pick[turning] * (len(self.animal_directions) - 1)).astype(np.int64)
+        headings[turning] = new + (new >= headings[turning])
+
+        # apply the movement, bouncing off the edges of the map
+        moved = locations + self.animal_directions[headings]
+        off_map = ((moved < 0) | (moved >= self.map_limits)).any(axis = 1)
+        # directions are numbered row by row, so the opposite of heading k is heading (last - k)
+        headings[off_map] = len(self.animal_directions) - 1 - headings[off_map]
+        moved = locations + self.animal_directions[headings]
+        state = state.copy()
+        state[moving, :2] = moved[moving]
+        state[moving, 2] = headings[moving]
+        if clock % CHECKPOINT_INTERVAL == 0:
+            self.checkpoints.save(clock, state)
+        return state
+
+    def set_animal_state(self, state):
+        self.animal_state = state
+        self.animal_hash.move(state[:, :2])
+
+    # every animal's location as a (row, column) tuple, only built for whoever asks for it
+    @property
+    def animal_locations(self):
+        return tuple(map(tuple, self.animal_state[:, :2].tolist()))
+
     def update_animals(self):
-        new_pairs = [self.update_single_animal(*pair) for pair in zip(self.animal_locations, self.animal_movements)]
-        self.animal_locations, self.animal_movements = list(zip(*new_pairs))
+        self.set_animal_state(self.step_animals(self.animal_state, self.game_clock))
+
+    # animal state at any game clock, without changing this game instance
+    # plays forward from whichever is closest before clock: this instance's current state,
+    # the latest checkpoint (see world.py) or the start of the game
+    def state_at(self, clock):
+        start, state = self.checkpoints.latest(clock)
+        if state is None:
+            start, state = 0, self.initial_animal_state
+        if start <= self.game_clock <= clock:
+            start, state = self.game_clock, self.animal_state
+        for tick in range(start + 1, clock + 1):
+            state = self.step_animals(state, tick)
+        return state
+
+    # move this game instance straight to clock, as if it had been queried every tick until then
+    # costs at most CHECKPOINT_INTERVAL steps once someone has played that far, however long the game has been
+    def advance_to(self, clock):
+        self.set_animal_state(self.state_at(clock))
+        self.game_clock = clock
 
     # randomly chooses a location on the map
-    def random_coord_helper(self):
-        return np.random.randint(MAP_DIMENSIONS[0]), np.random.randint(MAP_DIMENSIONS[1])
+    def random_coord_helper(self, rng):
+        return int(rng.integers(MAP_DIMENSIONS[0])), int(rng.integers(MAP_DIMENSIONS[1]))
 
     # randomly chooses magnitude of animal movement based on ANIMAL_RANGE
-    def random_movement_helper(self):
-        return np.random.randint(-ANIMAL_RANGE, ANIMAL_RANGE + 1), np.random.randint(-ANIMAL_RANGE, ANIMAL_RANGE + 1)
+    def random_movement_helper(self, rng):
+        return int(rng.integers(-ANIMAL_RANGE, ANIMAL_RANGE + 1)), int(rng.integers(-ANIMAL_RANGE, ANIMAL_RANGE + 1))
 
     def generate_terrain_grid(self):
-        ilim, jlim = MAP_DIMENSIONS
-        terra = np.ones(MAP_DIMENSIONS, dtype = np.int8)
-        # go up each diagonal
-        for d in range(1, ilim + jlim):
-            for i in reversed(range(min(ilim, d))):
-                j = d - 1 - i
-                # stop before you go past the right end of the map
-                if j >= jlim:
-                    break
-                # the adjacent squares on previous diagonal and previous square on current 
-                # diagonal are this square's neighbors
-                potential_neighbors = [(i+1, j-1), (i, j-1), (i-1, j)]
-                neighboring_terrain = [terra[loc] for loc in potential_neighbors if is_valid_location(loc)]
-                # keep the same type of terrain with some probability
-                if neighboring_terrain and np.random.rand() < MAINTAIN_TERRAIN_TYPE_PROB:
-                    terra[i, j] = np.random.choice(neighboring_terrain)
-                else:
-                    terra[i, j] = np.random.choice(len(Terrain), p = TERRAIN_PROBABILITIES)
-        return terra
-
-    def relayer_init(self):
+        rng = game_rng(self.starting_seed, 0, TERRAIN_STREAM)
+        if self.terrain_mode == 'fast':
+            return generate_terrain_wavefront(rng, MAP_DIMENSIONS)
+        return generate_terrain_classic(rng, MAP_DIMENSIONS)
+
+    # terrain of one chunk of a 'chunked' map, the same every time (and in every process) for a given seed
+    def generate_terrain_chunk(self, ci, cj, dims):
+        # the chunk's number takes the place of the clock in its generator's counter
+        rng = game_rng(self.starting_seed, ci * -(-MAP_DIMENSIONS[1] // CHUNK_SIZE) + cj, TERRAIN_CHUNK_STREAM)
+        return generate_terrain_wavefront(rng, dims)
+
+    def relayer_init(self, rng):
         ratio = MAP_DIMENSIONS[0] / MAP_DIMENSIONS[1]
         assert ratio >= 0.8 and ratio <= 1.2, \
             "The ratio of the side lengths should be somewhat close to 1 for this init method to be reasonable"
         relayer_locations = []
-        n = int(np.sqrt(NUM_RELAYERS)) # we're imposing an n x n grid over map
+        n = relayer_grid_side(NUM_RELAYERS) # we're imposing an n x n grid over map
         s1, s2 = MAP_DIMENSIONS[0] / n, MAP_DIMENSIONS[1] / n
         d = (1 - RELAYER_GRID_CENTER_RATIO) / 2 # offset to create a smaller square between [d, 1-d] instead of [0, 1]
         for i in range(n):
             for j in range(n):
                 # randomly generate the relayer inside corresponding grid cell
-                x = np.random.randint(int(s1 * (i + d)), int(s1 * (i + 1 - d)))
-                y = np.random.randint(int(s2 * (j + d)), int(s2 * (j + 1 - d)))
+                x = int(rng.integers(int(s1 * (i + d)), int(s1 * (i + 1 - d))))
+                y = int(rng.integers(int(s2 * (j + d)), int(s2 * (j + 1 - d))))
                 relayer_locations.append((x, y))
         # randomly choose coordinates for extra positions
-        relayer_locations.extend([self.random_coord_helper() for _ in range(NUM_RELAYERS - n ** 2)])
-        return relayer_locations
\ No newline at end of file
+        relayer_locations.extend([self.random_coord_helper(rng) for _ in range(NUM_RELAYERS - n ** 2)])
+        return relayer_locations
+
+# side of the n x n grid relayer_init lays over the map, the relayers that don't fit in it go anywhere
+def relayer_grid_side(num_relayers):
+    return int(np.sqrt(num_relayers))
+
+# whether relayer_init can place num_relayers relayers on a map of the given dims: the middle of every grid cell
+# (RELAYER_GRID_CENTER_RATIO of its side) has to hold at least one whole row and column
+def relayer_grid_fits(dims, num_relayers):
+    n = relayer_grid_side(num_relayers)
+    d = (1 - RELAYER_GRID_CENTER_RATIO) / 2
+    for side in dims:
+        s = side / n
+        if any(int(s * (i + d)) >= int(s * (i + 1 - d)) for i in range(n)):
+            return False
+    return True
+
+# generate terrain one cell at a time using rng (a np.random.Generator)
+def generate_terrain_classic(rng, dims):
+    ilim, jlim = dims
+    terra = np.ones(dims, dtype = np.int8)
+    # go up each diagonal
+    for d in range(1, ilim + jlim):
+        for i in reversed(range(min(ilim, d))):
+            j = d - 1 - i
+            # stop before you go past the right end of the map
+            if j >= jlim:
+                break
+            # the adjacent squares on previous diagonal and previous square on current 
+            # diagonal are this square's neighbors
+            potential_neighbors = [(i+1, j-1), (i, j-1), (i-1, j)]
+            neighboring_terrain = [terra[loc] for loc in potential_neighbors 
+                                   if 0 <= loc[0] < ilim and 0 <= loc[1] < jlim]
+            # keep the same type of terrain with some probability
+            if neighboring_terrain and rng.random() < MAINTAIN_TERRAIN_TYPE_PROB:
+                terra[i, j] = rng.choice(neighboring_terrain)
+            else:
+                terra[i, j] = rng.choice(len(Terrain), p = TERRAIN_PROBABILITIES)
+    return terra
+
+# generate terrain one anti-diagonal at a time using rng (a np.random.Generator)
+# follows the same rules as the classic generator, but every random draw for a diagonal is made up front
+# the only dependency within a diagonal is on the previous square, so cells that copy their predecessor
+# are resolved with a forward fill from the nearest cell before them that doesn't
+def generate_terrain_wavefront(rng, dims):
+    ilim, jlim = dims
+    terra = np.ones(dims, dtype = np.int8)
+    cumulative_probs = np.cumsum(TERRAIN_PROBABILITIES)
+    for d in range(1, ilim + jlim):
+        # cells on this diagonal, in the same order as the classic generator (decreasing i)
+        i = np.arange(min(ilim, d) - 1, max(0, d - jlim) - 1, -1)
+        j = d - 1 - i
+        n = len(i)
+        # neighbor columns: previous square on this diagonal, left square, upper square
+        valid = np.stack([(i + 1 < ilim) & (j >= 1), j >= 1, i >= 1], axis = 1)
+        num_valid = valid.sum(axis = 1)
+        maintain = (rng.random(n) < MAINTAIN_TERRAIN_TYPE_PROB) & (num_valid > 0)
+        # pick one of the valid neighbors uniformly at random
+        pick = (rng.random(n) * num_valid).astype(np.int64)
+        choice = np.argmax(valid & (np.cumsum(valid, axis = 1) - 1 == pick[:, None]), axis = 1)
+        fresh = np.searchsorted(cumulative_probs, rng.random(n), side = 'right')
+        values = np.minimum(fresh, len(Terrain) - 1).astype(np.int8)
+
+        left = maintain & (choice == 1)
+        values[left] = terra[i[left], j[left] - 1]
+        up = maintain & (choice == 2)
+        values[up] = terra[i[up] - 1, j[up]]
+        # the first cell never has a predecessor, so the forward fill always finds a source
+        copies_previous = maintain & (choice == 0)
+        source = np.where(copies_previous, 0, np.arange(n))
+        np.maximum.accumulate(source, out = source)
+        terra[i, j] = values[source]
+    return terra
@@ -0,0 +1,76 @@
+from functools import lru_cache
+import numpy as np
+
+from chunks import make_grid
+
+# disks here are the cells within euclidean distance radius of their center, i.e. di ** 2 + dj ** 2 <= radius ** 2,
+# worked out once per radius instead of once per cell
+
+# boolean (2 * radius + 1) square mask of the disk, centered on the middle cell
+@lru_cache(maxsize = None)
+def disk_mask(radius):
+    offsets = np.arange(-radius, radius + 1)
+    mask = offsets[:, None] ** 2 + offsets[None, :] ** 2 <= radius ** 2
+    mask.flags.writeable = False
+    return mask
+
+# (di, dj) offsets of every cell in the disk
+@lru_cache(maxsize = None)
+def disk_offsets(radius):
+    di, dj = np.nonzero(disk_mask(radius))
+    offsets = np.stack([di - radius, dj - radius], axis = 1)
+    offsets.flags.writeable = False
+    return offsets
+
+# row and column indices of every cell within radius of any of the centers, clipped to a map of the given dims
+# cells covered by more than one disk appear more than once
+def disk_cells(centers, radius, dims):
+    centers = np.asarray(centers, dtype = np.int64).reshape(-1, 2)
+    cells = (centers[:, None, :] + disk_offsets(radius)[None, :, :]).reshape(-1, 2)
+    inside = (cells[:, 0] >= 0) & (cells[:, 0] < dims[0]) & (cells[:, 1] >= 0) & (cells[:, 1] < dims[1])
+    return cells[inside, 0], cells[inside, 1]
+
+# which of the (di, dj) offsets from a disk's center lie within the disk of the given radius, as a boolean array
+def in_disk(offsets, radius):
+    offsets = np.asarray(offsets, dtype = np.int64).reshape(-1, 2)
+    inside = (np.abs(offsets) <= radius).all(axis = 1)
+    result = np.zeros(len(offsets), dtype = bool)
+    result[inside] = disk_mask(radius)[offsets[inside, 0] + radius, offsets[inside, 1] + radius]
+    return result
+
+# what a world's fixed layout looks like from every cell, worked out once when the world is set up
+# coverage[i, j] numbers the set of relayers in communication range of the cell, and hearing[coverage[i, j]]
+# is that set as a boolean mask over the relayers, so which relayers can hear a location is one lookup
+# however many relayers there are (cells out of everyone's range are all coverage 0, the empty set)
+class Geometry:
+    def __init__(self, relayer_locations, dims, comm_radius):
+        self.dims = tuple(dims)
+        self.comm_radius = comm_radius
+        num_relayers = len(relayer_locations)
+        self.coverage = make_grid(self.dims, 0, np.int32)
+        hearing = [np.zeros(num_relayers, dtype = bool)]
+        # coverage number of each (coverage, relayer) combination made so far
+        combined = dict()
+        for relayer, location in enumerate(relayer_locations):
+            i, j = disk_cells([location], comm_radius, self.dims)
+            old, inverse = np.unique(self.coverage[i, j], return_inverse = True)
+            new = []
+            for coverage in old.tolist():
+                if (coverage, relayer) not in combined:
+                    combined[coverage, relayer] = len(hearing)
+                    mask = hearing[coverage].copy()
+                    mask[relayer] = True
+                    hearing.append(mask)
+                new.append(combined[coverage, relayer])
+            self.coverage[i, j] = np.array(new, dtype = np.int32)[inverse]
+        self.hearing = np.array(hearing).reshape(-1, num_relayers)
+        self.hearing.flags.writeable = False
+
+    # boolean mask of the relayers within communication range of location
+    def in_range(self, location):
+        return self.hearing[self.coverage[location]]
+
+# geometry of the world with the given relayers, shared by every game instance in the process that plays in it
+@lru_cache(maxsize = None)
+def world_geometry(relayer_locations, dims, comm_radius):
+    return Geometry(relayer_locations, dims, comm_radius)
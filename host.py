@@ -0,0 +1,108 @@
+import sys
+import argparse
+from collections import defaultdict, deque
+
+from game import *
+from common import *
+from transport import make_transport
+from publisher import connect_visualizer
+from runner import Runner
+from config import apply_config, load_config
+
+# one runner's end of a relayer connection that every runner on a host shares, with the interface of a connection
+# sends wait in the host's outbox until it flushes them, and receives only see the messages for this runner
+class Mailbox:
+    def __init__(self, host, relayer, runner):
+        self.host = host
+        self.relayer = relayer
+        self.runner = runner
+
+    def send(self, payload):
+        self.host.outboxes[self.relayer].append(payload)
+
+    def recv(self):
+        return self.host.receive(self.relayer, self.runner)
+
+    def close(self):
+        pass
+
+# many runners in one process, sharing one game instance that is stepped once per timestep, one connection to each
+# relayer and one to the visualizer, instead of each of them paying for all of that in its own process
+# every message between runners and relayers carries the runner's id (see codec.py), which is how relayers tell the
+# runners on a connection apart and how the host sorts what comes back into each runner's inbox
+class RunnerHost:
+    def __init__(self, seed, ids):
+        self.game_instance = Game(seed)
+        self.transport = make_transport()
+        self.sockets = [self.transport.connect(PORT_START + i, RUNNER_TRANSMISSION_SIZE_LIMIT)
+                        for i in range(NUM_RELAYERS)]
+        # messages waiting to go to each relayer, and messages from each relayer that no runner has read yet
+        self.outboxes = [[] for _ in range(NUM_RELAYERS)]
+        self.inboxes = [defaultdict(deque) for _ in range(NUM_RELAYERS)]
+        self.publisher = connect_visualizer(self.transport)
+        self.runners = [Runner(seed, id, host = self) for id in ids]
+
+        # tell spawner that everything has been set up correctly
+        alert_spawn_process()
+
+    # a runner's ends of the relayer connections, in relayer order like a runner's own sockets
+    def mailboxes(self, runner):
+        return [Mailbox(self, relayer, runner) for relayer in range(NUM_RELAYERS)]
+
+    # send everything the runners have queued up, as one batch per relayer
+    def flush(self):
+        for sock, outbox in zip(self.sockets, self.outboxes):
+            if outbox:
+                sock.send_frames(outbox)
+                outbox.clear()
+
+    # next message from relayer for runner, holding on to any for other runners that come first
+    # returns b'' once the relayer has closed the connection
+    def receive(self, relayer, runner):
+        inbox = self.inboxes[relayer][runner]
+        while not inbox:
+            frame = self.sockets[relayer].recv()
+            if not frame:
+                return b''
+            self.inboxes[relayer][message_id(frame)].append(frame)
+        return inbox.popleft()
+
+    def active_runners(self):
+        return [runner for runner in self.runners if runner.alive and not runner.won and not runner.game_over]
+
+    # one timestep for every runner still playing, in the same two halves as a runner on its own
+    # every runner reports before any of them waits for the relayers, who only answer once they've heard from all
+    def one_step(self):
+        runners = self.active_runners()
+        states = self.game_instance.query_many([runner.move() for runner in runners], is_runner = True)
+        for runner, state in zip(runners, states):
+            runner.report(state)
+        self.flush()
+        for runner in runners:
+            if runner.alive and not runner.won:
+                runner.plan()
+
+    def close(self):
+        for sock in self.sockets:
+            sock.close()
+        self.publisher.close()
+
+def main(seed, ids):
+    # play with the same configuration as everyone else (see config.py)
+    apply_config(load_config())
+    assert all(0 <= id < NUM_RUNNERS for id in ids), "invalid runner id"
+    host = RunnerHost(seed, ids)
+    try:
+        while host.active_runners():
+            host.one_step()
+    except KeyboardInterrupt:
+        sys.exit()
+    host.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Run several runners in one process")
+    parser.add_argument('seed', type = int)
+    parser.add_argument('first', type = int, help = "id of the first runner on this host")
+    parser.add_argument('count', type = int, help = "how many runners, with consecutive ids")
+    args = parser.parse_args()
+    main(args.seed, list(range(args.first, args.first + args.count)))
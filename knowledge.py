@@ -0,0 +1,51 @@
+import numpy as np
+
+# source for cells a relayer saw itself or heard about from a runner
+LOCAL_SOURCE = -1
+# how many log entries to look at at a time when skipping over ones a reader should not get back
+READ_CHUNK = 256
+
+# append-only record of the cells a relayer has learned, in the order it learned them, and where each came from
+# every reader (e.g. one per peer) keeps its own cursor into the log and asks for what was added since,
+# so keeping a peer up to date costs O(new cells) instead of a pass over the whole map
+class KnowledgeLog:
+    def __init__(self, capacity = 1024):
+        self.cells = np.empty(capacity, dtype = np.int64)
+        self.sources = np.empty(capacity, dtype = np.int64)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    # add flat cell indices learned from source
+    def append(self, cells, source = LOCAL_SOURCE):
+        cells = np.asarray(cells, dtype = np.int64).ravel()
+        end = self.size + len(cells)
+        if end > len(self.cells):
+            capacity = max(end, 2 * len(self.cells))
+            self.cells = np.resize(self.cells, capacity)
+            self.sources = np.resize(self.sources, capacity)
+        self.cells[self.size:end] = cells
+        self.sources[self.size:end] = source
+        self.size = end
+
+    # up to limit cells from cursor onwards, leaving out the ones that came from exclude
+    # returns the cells, their positions in the log, and how far the log was read
+    # a reader that only uses the first n cells should carry on from positions[n] next time, or from the end if n == all
+    def read(self, cursor, limit, exclude = None):
+        cells, positions = [], []
+        found = 0
+        while cursor < self.size and found < limit:
+            end = min(cursor + max(READ_CHUNK, limit), self.size)
+            keep = np.arange(cursor, end)
+            if exclude is not None:
+                keep = keep[self.sources[cursor:end] != exclude]
+            keep = keep[:limit - found]
+            cells.append(self.cells[keep])
+            positions.append(keep)
+            found += len(keep)
+            # stop right after the last kept entry if that filled the request, so nothing after it is skipped
+            cursor = keep[-1] + 1 if found == limit else end
+        if not cells:
+            return np.empty(0, dtype = np.int64), np.empty(0, dtype = np.int64), cursor
+        return np.concatenate(cells), np.concatenate(positions), cursor
@@ -0,0 +1,142 @@
+import heapq
+from collections import defaultdict
+
+INF = float('inf')
+
+# offsets to the 8 neighbours of a cell
+NEIGHBOR_OFFSETS = [(di, dj) for di in range(-1, 2) for dj in range(-1, 2) if (di, dj) != (0, 0)]
+
+# incremental shortest path planner (D* Lite) over the 8-connected map grid
+# stepping from a cell to any of its neighbours costs that cell's cost (its wait time plus one), so the cheapest
+# cost is 1 and the Chebyshev distance is an admissible and consistent heuristic
+# the search runs backwards from the goal, which lets it keep its work while the start moves:
+# learning a cell's cost only touches that cell and whatever routes actually went through it,
+# and only a new goal throws the previous search away
+# cells are flat row-major indices, and g/rhs/costs are dictionaries keyed by them that only hold the cells
+# the search has touched, so neither the memory nor the time a search takes grows with the size of the map
+class Planner:
+    def __init__(self, dims):
+        self.rows, self.cols = dims
+        # cells are assumed to be flat ground until set_costs says otherwise
+        self.costs = defaultdict(lambda: 1)
+        self.goal = None
+
+    def index(self, location):
+        return location[0] * self.cols + location[1]
+
+    def location(self, cell):
+        return divmod(cell, self.cols)
+
+    def neighbors(self, cell):
+        i, j = divmod(cell, self.cols)
+        return [(i + di) * self.cols + j + dj for di, dj in NEIGHBOR_OFFSETS
+                if 0 <= i + di < self.rows and 0 <= j + dj < self.cols]
+
+    # Chebyshev distance between two cells
+    def heuristic(self, a, b):
+        ai, aj = divmod(a, self.cols)
+        bi, bj = divmod(b, self.cols)
+        return max(abs(ai - bi), abs(aj - bj))
+
+    def key(self, cell):
+        best = min(self.g[cell], self.rhs[cell])
+        return (best + self.heuristic(self.start, cell) + self.km, best)
+
+    # (re)queue a cell under its current key, or take it off the queue if it's consistent
+    # the heap is lazy: entries whose key no longer matches self.queued are skipped when popped
+    def update(self, cell):
+        if self.g[cell] != self.rhs[cell]:
+            key = self.key(cell)
+            self.queued[cell] = key
+            heapq.heappush(self.heap, (key, cell))
+        else:
+            self.queued.pop(cell, None)
+
+    # start a fresh search towards a new goal
+    def reset(self, start, goal):
+        self.goal, self.start, self.last_start = goal, start, start
+        self.g = defaultdict(lambda: INF)
+        self.rhs = defaultdict(lambda: INF)
+        self.km = 0
+        self.heap = []
+        self.queued = {}
+        self.rhs[goal] = 0
+        self.update(goal)
+
+    # new costs for some cells, e.g. once their terrain is known
+    def set_costs(self, cells, costs):
+        for cell, cost in zip(cells, costs):
+            if cost == self.costs[cell]:
+                continue
+            self.costs[cell] = cost
+            # only the edges out of this cell changed
+            if self.goal is not None and cell != self.goal:
+                self.rhs[cell] = cost + min(self.g[v] for v in self.neighbors(cell))
+                self.update(cell)
+
+    def top(self):
+        while self.heap:
+            key, cell = self.heap[0]
+            if self.queued.get(cell) == key:
+                return key, cell
+            heapq.heappop(self.heap)
+        return None, None
+
+    def compute_shortest_path(self):
+        g, rhs, costs = self.g, self.rhs, self.costs
+        start = self.start
+        while True:
+            key, cell = self.top()
+            if key is None:
+                break
+            # besides the usual stopping rule, settle everything that could tie with the best route out of start,
+            # so that next_step can break ties between equally good neighbours exactly
+            if key >= self.key(start) and rhs[start] == g[start] and key[0] > g[start] + self.km:
+                break
+            new_key = self.key(cell)
+            if key < new_key:
+                # the key went stale as the start moved, requeue it under the right one
+                self.queued[cell] = new_key
+                heapq.heapreplace(self.heap, (new_key, cell))
+                continue
+            heapq.heappop(self.heap)
+            del self.queued[cell]
+            if g[cell] > rhs[cell]:
+                g[cell] = rhs[cell]
+                for v in self.neighbors(cell):
+                    if v != self.goal and costs[v] + g[cell] < rhs[v]:
+                        rhs[v] = costs[v] + g[cell]
+                        self.update(v)
+            else:
+                old = g[cell]
+                g[cell] = INF
+                for v in self.neighbors(cell) + [cell]:
+                    if v != self.goal and rhs[v] == costs[v] + old:
+                        rhs[v] = costs[v] + min(g[u] for u in self.neighbors(v))
+                    self.update(v)
+
+    # up to length cells of the cheapest route out of start found by the last next_step, not including start
+    def route(self, start, length):
+        cells = []
+        cell = self.index(start)
+        while len(cells) < length and cell != self.goal:
+            cell = min(self.neighbors(cell), key = lambda v: (self.g[v], v))
+            # the search never reached this far
+            if self.g[cell] == INF:
+                break
+            cells.append(self.location(cell))
+        return cells
+
+    # the neighbour of start to move to next on a cheapest route to goal
+    # ties go to the smallest (i, j), the same neighbour a Dijkstra search from the goal would pick
+    def next_step(self, start, goal):
+        start, goal = self.index(start), self.index(goal)
+        assert start != goal
+        if goal != self.goal:
+            self.reset(start, goal)
+        else:
+            # keys already in the heap were computed for the old start, shift every key to come by as much instead
+            self.km += self.heuristic(self.last_start, start)
+            self.start = self.last_start = start
+        self.compute_shortest_path()
+        return self.location(min(self.neighbors(start), key = lambda v: (self.g[v], v)))
@@ -0,0 +1,103 @@
+import os
+import time
+import atexit
+import queue
+import threading
+
+from common import VISUALIZER_PORT, VISUALIZER_TRANSMISSION_SIZE_LIMIT
+
+# frames a game process holds for the visualizer before it starts dropping new ones
+PUBLISH_QUEUE_FRAMES = 16
+# how long a process that is exiting waits for its queued frames to go out
+CLOSE_TIMEOUT = 1.0
+# how often a publish that waits for room checks that the visualizer is still there
+WAIT_POLL = 0.1
+# when the visualizer is exporting, every frame matters, so spawn sets this environment variable to '1' for every
+# game process, which then waits for room for every frame instead of dropping it (and for all of them when exiting)
+LOSSLESS_ENV = 'ADELPHON_LOSSLESS_FRAMES'
+
+# fire-and-forget channel from a game process to the visualizer
+# publish doesn't wait by default: frames go into a bounded queue that a background thread sends from, and once the
+# visualizer has fallen far enough behind to fill it, new frames are dropped until there's room again
+# messages the visualizer can't do without (a runner dying or winning) wait for room instead of being dropped
+# frames over the visualizer's size limit are dropped (and counted) by the background thread
+# every frame describes the whole state of its process, so the visualizer only ever needs the latest one
+# with no visualizer connected (or once it has gone away) every frame is dropped
+# a lossless publisher treats every frame as one the visualizer can't do without
+class Publisher:
+    def __init__(self, conn = None, capacity = PUBLISH_QUEUE_FRAMES, lossless = False):
+        self.conn = conn
+        self.lossless = lossless
+        self.frames = queue.Queue(capacity)
+        self.dropped = 0
+        # frames the connection refused for being over its size limit, which are dropped too
+        self.oversized = 0
+        if conn is not None:
+            self.thread = threading.Thread(target = self.send_loop, args = (conn,), daemon = True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    # whether frames can go anywhere, so callers can skip building frames nobody will see
+    @property
+    def connected(self):
+        return self.conn is not None
+
+    # queue a frame for the visualizer, returns whether it was accepted
+    # with wait, a full queue holds the caller up until there's room rather than dropping the frame
+    def publish(self, frame, wait = False):
+        if self.conn is None:
+            return False
+        try:
+            self.frames.put_nowait(frame)
+        except queue.Full:
+            if wait or self.lossless:
+                return self.put_waiting(frame)
+            self.dropped += 1
+            return False
+        return True
+
+    # wait up to timeout seconds (None for as long as it takes) for room for frame, returns whether it got in
+    # gives up early if the visualizer goes away in the meantime, which ends the background thread
+    def put_waiting(self, frame, timeout = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.thread.is_alive():
+            try:
+                self.frames.put(frame, timeout = WAIT_POLL)
+                return True
+            except queue.Full:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+        return False
+
+    def send_loop(self, conn):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                return
+            try:
+                conn.send(frame)
+            except ValueError:
+                self.oversized += 1
+            except OSError:
+                # the visualizer went away, which the game doesn't care about
+                self.conn = None
+                return
+
+    # give the frames still queued a chance to go out (every one of them, if lossless), then close the connection
+    def close(self):
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        atexit.unregister(self.close)
+        timeout = None if self.lossless else CLOSE_TIMEOUT
+        if self.put_waiting(None, timeout):
+            self.thread.join(timeout)
+        conn.close()
+
+# connect to the visualizer if there is one, otherwise return a publisher that drops everything
+def connect_visualizer(transport):
+    try:
+        conn = transport.connect(VISUALIZER_PORT, VISUALIZER_TRANSMISSION_SIZE_LIMIT)
+    except OSError:
+        conn = None
+    return Publisher(conn, lossless = os.environ.get(LOSSLESS_ENV) == '1')
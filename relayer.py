@@ -1,150 +1,212 @@
 import sys
-import socket
 import selectors
 import types
+from collections import Counter
 import numpy as np
 
 from game import *
 from common import *
-from visualizer import BLANK_INDEX
+from transport import make_transport
+from spatial import UncheckedIndex
+from geometry import disk_cells
+from chunks import make_grid
+from config import apply_config, load_config
+from knowledge import KnowledgeLog, LOCAL_SOURCE
+from topology import make_topology
+from publisher import Publisher, connect_visualizer
 
 WAITING_FOR_RUNNERS = 'a'
 WAITING_FOR_RELAYERS = 'b'
 
 class Relayer:
-    def __init__(self, seed, id):
+    def __init__(self, seed, id, headless = False):
         self.id = id
+        self.headless = headless
         self.game_instance = Game(seed)
-        print(f"Relayer {self.id} is up and relaying")
         # setup data structures that represent this relayer's knowledge
         self.treasure_location = None
         self.animal_locations = set() # set of tuples (x,y)
         # local game map with this relayer's knowledge of terrain
-        self.terrains = np.full(MAP_DIMENSIONS, BLANK_INDEX, dtype=np.int8)
-        self.coords = generate_coord_grid()
+        self.terrains = make_grid(MAP_DIMENSIONS, BLANK_INDEX, np.int8)
         self.location = self.game_instance.relayer_locations[self.id]
 
-        # setup sockets for communication
-        self.address = socket.gethostbyname(socket.gethostname())
-        self.runner_facing_port = PORT_START + id
-        self.relayer_facing_port = PORT_START + NUM_RELAYERS + id
-        self.sel = selectors.DefaultSelector()
-        self.relayer_connections = []
-        self.runner_connections = set()
-        # socket for all runners to connect to
-        self.runner_facing_socket = self.listening_socket(self.runner_facing_port)
-        # socket for higher id relayers to connect to
-        self.relayer_facing_socket = self.listening_socket(self.relayer_facing_port)
-
-        # connect to lower id relayers
-        self.lower_relayer_sockets = [socket.socket(socket.AF_INET, socket.SOCK_STREAM) for _ in range(id)]
-        for i in range(id):
-            self.lower_relayer_sockets[i].connect((self.address, PORT_START + NUM_RELAYERS + i))
-            self.sel.register(self.lower_relayer_sockets[i], selectors.EVENT_READ, 
-                              data = types.SimpleNamespace(port = PORT_START + NUM_RELAYERS + i))
-
-        self.visualizer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.visualizer_socket.connect((self.address, VISUALIZER_PORT))
+        # which relayers this one syncs with and how
+        self.topology = make_topology(NUM_RELAYERS)
+        # headless relayers are wired up to an in-memory message bus by the engine instead
+        # connections to the relayers this one syncs with, keyed by relayer id
+        self.relayer_sockets = dict()
+        # connection to each runner still playing, keyed by runner id
+        # a runner host (see host.py) talks for many runners over one connection, and every message to or from a
+        # runner carries its id, so everything about runners is keyed by id rather than by connection
+        self.runner_connections = dict()
+        # the visualizer is optional, frames go nowhere unless setup_sockets finds one to connect to
+        self.publisher = Publisher()
+        # the visualizer gets the knowledge map in bands of this many rows, each small enough for one frame,
+        # and only the bands with cells it hasn't been sent yet (see publish_frames)
+        self.frame_rows = relayer_frame_rows(MAP_DIMENSIONS[1], NUM_RUNNERS, NUM_ANIMALS,
+                                             VISUALIZER_TRANSMISSION_SIZE_LIMIT)
+        self.unpublished_bands = set()
+        if not headless:
+            print(f"Relayer {self.id} is up and relaying")
+            self.setup_sockets()
 
         # setup data structures that help implement relayer logic
         self.runner_attendance = 0
         self.runner_count = NUM_RUNNERS
-        self.relayer_attendance = 0
-        # these three dictionaries use sockets (from self.runner_connections) as keys
-        # to make it easier to reply to runners
+        # messages received from each peer relayer this timestep, and how many are needed to finish the current stage
+        self.relayer_messages = Counter()
+        self.relayer_messages_needed = Counter()
+        # this timestep's sync stages (see topology.py) and how far through them this relayer is
+        self.sync_tick = 0
+        self.sync_stages = []
+        self.sync_stage = 0
+        self.sync_stage_sent = False
+        # these three dictionaries are keyed by runner id, like self.runner_connections
         self.runner_within_range = dict()
         self.runner_locations = dict()
         self.existing_targets = dict()
         # before relayers sync, this set only contains nearby runner locations
         # and after the sync, it contains all runners within range of any relayer
         self.current_runner_locations = set()
-        # boolean array for whether a runner has gotten close enough to each grid position to check for treasure
-        self.checked_for_treasure = np.full(MAP_DIMENSIONS, False)
+        # whether a runner has gotten close enough to each grid position to check for treasure,
+        # indexed so that the closest unchecked position to a runner can be found quickly
+        self.unchecked_cells = UncheckedIndex(MAP_DIMENSIONS)
+        # every terrain cell this relayer has learned, in order, where a cell's position in the log is its version:
+        # each peer's delta is whatever was logged past its cursor
+        self.knowledge = KnowledgeLog()
+        # how far through the knowledge log each peer relayer has been sent, keyed by relayer id
+        self.peer_cursors = dict()
         self.phase = WAITING_FOR_RUNNERS
         self.won = False
+        # set once the game has ended for this relayer, either by being won or by every runner dying
+        self.game_over = False
 
         # tell spawner that everything has been set up correctly
-        alert_spawn_process()
+        if not headless:
+            alert_spawn_process()
+
+    def setup_sockets(self):
+        self.transport = make_transport()
+        self.runner_facing_port = PORT_START + self.id
+        self.relayer_facing_port = PORT_START + NUM_RELAYERS + self.id
+        self.sel = selectors.DefaultSelector()
+        # socket for all runners to connect to
+        self.runner_facing_socket = self.listening_socket(self.runner_facing_port)
+        # socket for higher id relayers to connect to
+        self.relayer_facing_socket = self.listening_socket(self.relayer_facing_port)
+
+        # connect to the lower id relayers this one syncs with, the higher id ones connect to this one
+        for peer in self.topology.neighbors(self.id):
+            if peer < self.id:
+                sock = self.transport.connect(PORT_START + NUM_RELAYERS + peer, RELAYER_TRANSMISSION_SIZE_LIMIT)
+                # every relayer connects to the same port, so say who you are
+                sock.send(encode_control(KIND_HELLO, self.id))
+                self.relayer_sockets[peer] = sock
+                self.sel.register(sock, selectors.EVENT_READ, data = types.SimpleNamespace(peer = f"relayer {peer}"))
+
+        self.publisher = connect_visualizer(self.transport)
 
     # helper function to create and register a listening socket at the given port
     def listening_socket(self, port):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.bind((self.address, port))
-        sock.listen()
+        sock = self.transport.listen(port)
         sock.setblocking(False)
         self.sel.register(sock, selectors.EVENT_READ, data = None)
         return sock
 
     # a wrapper function for accepting sockets w/ selector
     def accept_wrapper(self, sock):
-        conn, (addr, port) = sock.accept()
+        conn, peer = self.transport.accept(sock, RELAYER_TRANSMISSION_SIZE_LIMIT)
+        buffered = []
+        # runners on a new connection are added to runner_connections once their first message arrives
         if sock == self.runner_facing_socket:
-            self.runner_connections.add(conn)
+            pass
         elif sock == self.relayer_facing_socket:
-            self.relayer_connections.append(conn)
+            # the connecting relayer introduces itself before anything else
+            conn.setblocking(True)
+            hello = decode(conn.recv())
+            assert hello.kind == KIND_HELLO, f"expected a hello from a new relayer connection, got kind {hello.kind}"
+            self.relayer_sockets[hello.id] = conn
+            # whatever the peer sent right after its hello may have been read along with it, and the selector
+            # won't report those frames, so they are handled here
+            buffered = conn.buffered_frames()
         else:
             raise Exception("unrecognized socket")
         conn.setblocking(False)
         events = selectors.EVENT_READ
-        self.sel.register(conn, events, data = types.SimpleNamespace(port = port))
+        self.sel.register(conn, events, data = types.SimpleNamespace(peer = peer))
+        for frame in buffered:
+            self.handle_data(conn, frame)
+            if self.game_over:
+                return
 
     # process incoming data from a connection
     def service_connection(self, key):
         sock = key.fileobj
-        recv_data = sock.recv(RELAYER_TRANSMISSION_SIZE_LIMIT)
-        if recv_data:
-            recv_data = recv_data.decode("utf-8")
-            # runners that are too far away will still send a heartbeat so we can make sure
-            # all runners and relayers are synced up in the game
-            if recv_data == TOO_FAR_AWAY:
-                self.runner_within_range[sock] = False
-                self.runner_attendance += 1
-            else:
-                recv_data = recv_data.split("|")
-                # runner message
-                if recv_data[0] == RUNNER_CODE:
-                    # handle special case of the runner either dying or winning
-                    if len(recv_data) == 3:
-                        msg = recv_data[2]
-                        if msg == IM_DEAD:
-                            # close socket for this runner and remove them from active runner connections
-                            self.runner_connections.remove(sock)
-                            self.sel.unregister(sock)
-                            sock.close()
-                            self.runner_count -= 1
-                            if self.runner_count == 0:
-                                sys.exit() # GAME OVER because all runners have died
-                        elif msg == I_WON:
-                            self.runner_attendance += 1
-                            self.won = True # GAME OVER but wait till relayer sync to exit gracefully
-                        else:
-                            raise ValueError(f"Invalid msg: {msg}")
-                    # standard runner case
-                    else:
-                        self.runner_within_range[sock] = True
-                        location = self.parse_info(recv_data)
-                        self.runner_locations[sock] = location
-                        self.current_runner_locations.add(location)
-                        self.runner_attendance += 1
-                # relayer message
-                elif recv_data[0] == RELAYER_CODE:
-                    self.parse_info(recv_data)
-                    self.relayer_attendance += 1
-                else:
-                    raise Exception(f"Invalid data: {recv_data}")
+        frames = sock.recv_frames()
+        if frames is not None:
+            # a single read can pick up several messages, e.g. consecutive syncs from a faster relayer
+            for frame in frames:
+                self.handle_data(sock, frame)
+                if self.game_over:
+                    return
         else:
             self.sel.unregister(sock)
             sock.close()
-            self.runner_connections.discard(sock) # won't throw an error if the socket isn't a runner sock
+            # runner processes hang up once every runner on them is dead, which is expected,
+            # but losing a runner that is still playing or another relayer is not
+            lost = [id for id, conn in self.runner_connections.items() if conn is sock]
+            for id in lost:
+                del self.runner_connections[id]
             # this is fine if you've already won because the sys exits won't be perfectly in sync
-            if not self.won:
+            if not self.won and (lost or sock in self.relayer_sockets.values()):
                 raise ConnectionError(f"Closing connection to {sock}")
+
+    # process one message received on sock
+    def handle_data(self, sock, recv_data):
+        message = decode(recv_data)
+        # runners that are too far away will still send a heartbeat so we can make sure
+        # all runners and relayers are synced up in the game
+        if message.kind == KIND_TOO_FAR_AWAY:
+            self.runner_connections[message.id] = sock
+            self.runner_within_range[message.id] = False
+            self.runner_attendance += 1
+        # handle special case of the runner either dying or winning
+        elif message.kind == KIND_IM_DEAD:
+            # remove them from active runner connections, their process closes the connection once nobody on it
+            # is playing any more (see service_connection)
+            self.runner_connections.pop(message.id, None)
+            self.runner_count -= 1
+            if self.runner_count == 0:
+                self.game_over = True # GAME OVER because all runners have died
+                return
+        elif message.kind == KIND_I_WON:
+            self.runner_attendance += 1
+            self.won = True # GAME OVER but wait till relayer sync to exit gracefully
+            # the winner exits straight away, so only the other runners need to hear that the game is won
+            self.runner_connections.pop(message.id, None)
+        # standard runner case
+        elif message.kind == KIND_RUNNER_REPORT:
+            self.runner_connections[message.id] = sock
+            self.runner_within_range[message.id] = True
+            self.parse_info(message)
+            location = message.locations[0]
+            self.runner_locations[message.id] = location
+            self.current_runner_locations.add(location)
+            self.runner_attendance += 1
+        # relayer message
+        elif message.kind == KIND_RELAYER_REPORT:
+            self.parse_info(message, message.id)
+            self.relayer_messages[message.id] += 1
+        else:
+            raise ValueError(f"Invalid message kind: {message.kind}")
         # sync with other relayers once you've heard back from all runners
         if self.runner_attendance == self.runner_count and self.phase == WAITING_FOR_RUNNERS:
             self.sync_with_relayers()
+            if self.game_over:
+                return
             self.phase = WAITING_FOR_RELAYERS
-        # sync with runners once you've heard back from all other relayers
-        if self.relayer_attendance == (NUM_RELAYERS - 1) and self.phase == WAITING_FOR_RELAYERS:
+        # sync with runners once every stage of the relayer sync is done
+        if self.phase == WAITING_FOR_RELAYERS and self.advance_sync():
             self.sync_with_runners()
             self.phase = WAITING_FOR_RUNNERS
 
@@ -152,9 +214,14 @@ class Relayer:
     def sync_with_relayers(self):
         if self.won:
             # tell all runners that the game has been won, then exit
-            for sock in self.runner_connections:
-                sock.send(WE_WON.encode("utf-8"))
-            sys.exit()
+            for id, sock in self.runner_connections.items():
+                # runners leave as soon as any relayer tells them, so some may already be gone
+                try:
+                    sock.send(encode_control(KIND_WE_WON, id))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+            self.game_over = True
+            return
 
         # query the map and update state
         game_state = self.game_instance.query(self.location, is_runner = False)
@@ -163,134 +230,163 @@ class Relayer:
         if treasure:
             self.treasure_location = treasure
         self.animal_locations.update(animals)
-        i, j = coords[:,:,0], coords[:,:,1]
-        self.terrains[i, j] = terrains
+        self.learn_terrain(coords[:,:,0], coords[:,:,1], terrains)
 
-        info = prepare_info(self.terrains, self.coords, self.animal_locations, self.treasure_location, 
-                            RELAYER_CODE, self.id, self.current_runner_locations)
-        # use self.relayer_connections to send info to higher id relayers
-        # and self.lower_relayer_sockets to send info to lower id relayers
-        for sock in (self.relayer_connections + self.lower_relayer_sockets):
-            sock.send(info.encode("utf-8"))
+        self.sync_stages = self.topology.stages(self.id, self.sync_tick)
+        self.sync_stage = 0
+        self.sync_stage_sent = False
+
+    # work through this timestep's sync stages as far as the messages received so far allow
+    # returns True once they're all done
+    def advance_sync(self):
+        while self.sync_stage < len(self.sync_stages):
+            send_to, wait_for = self.sync_stages[self.sync_stage]
+            if not self.sync_stage_sent:
+                for peer in send_to:
+                    self.relayer_sockets[peer].send(self.compile_info_for_relayer(peer))
+                self.sync_stage_sent = True
+                self.relayer_messages_needed.update(wait_for)
+            # faster peers may already have sent what later stages need, which is fine
+            if any(self.relayer_messages[peer] < n for peer, n in self.relayer_messages_needed.items()):
+                return False
+            self.sync_stage += 1
+            self.sync_stage_sent = False
+        return True
+
+    # info sent to a peer relayer: runner locations, treasure and animals as usual, then the terrain learned since
+    # the last sync with that peer, leaving out what that peer told us
+    # whatever doesn't fit stays queued for the next sync, oldest first, so a peer that falls behind catches up
+    def compile_info_for_relayer(self, peer):
+        cursor = self.peer_cursors.get(peer, 0)
+        cells, positions, end = self.knowledge.read(cursor, terrain_capacity(RELAYER_TRANSMISSION_SIZE_LIMIT),
+                                                    exclude = peer)
+        i, j = np.divmod(cells, MAP_DIMENSIONS[1])
+        info, _, n_terrain = encode_report(KIND_RELAYER_REPORT, self.id, self.current_runner_locations,
+                                           self.treasure_location, self.animal_locations, np.stack([i, j], axis = 1),
+                                           self.terrains[i, j], RELAYER_TRANSMISSION_SIZE_LIMIT)
+        self.peer_cursors[peer] = positions[n_terrain] if n_terrain < len(cells) else end
+        return info
+
+    # record terrain for the given cells, adding any this relayer didn't know yet to its knowledge log
+    def learn_terrain(self, i, j, codes, source = LOCAL_SOURCE):
+        i, j, codes = np.ravel(i), np.ravel(j), np.ravel(codes)
+        new = self.terrains[i, j] < 0
+        i, j = i[new], j[new]
+        self.terrains[i, j] = codes[new]
+        self.knowledge.append(np.unique(i * MAP_DIMENSIONS[1] + j), source)
+        self.unpublished_bands.update(np.unique(i // self.frame_rows).tolist())
+
+    # show this relayer's state on the visualizer, without waiting for it
+    # the first band of the knowledge map goes out every timestep with the treasure, animals and runners,
+    # any other band only once it has new cells, and a band whose frame didn't fit in the publisher's queue
+    # is sent again next timestep
+    def publish_frames(self):
+        for band in sorted(self.unpublished_bands | {0}):
+            first_row = band * self.frame_rows
+            knowledge = np.asarray(self.terrains[first_row:first_row + self.frame_rows, :])
+            if band == 0:
+                frame = encode_relayer_frame(self.id, self.game_instance.game_clock, self.treasure_location,
+                                             self.animal_locations, knowledge, self.current_runner_locations)
+            else:
+                frame = encode_relayer_frame(self.id, self.game_instance.game_clock, None, [], knowledge, [],
+                                             first_row)
+            if self.publisher.publish(frame):
+                self.unpublished_bands.discard(band)
 
     def sync_with_runners(self):
-        # send all of this relayer's knowledge to the visualizer
-        terra = self.encode_map()
-        data = RELAYER_CODE, self.id, self.treasure_location, self.animal_locations, terra, self.current_runner_locations
-        info = "|".join([str(d) for d in data])
-        self.visualizer_socket.sendall(info.encode("utf-8"))
-        # each relayer must wait for the visualizer to respond before actually letting the runners go ahead
-        self.visualizer_socket.recv(len(MESSAGE_RECEIVED))
+        if self.publisher.connected:
+            self.publish_frames()
 
         # reset info
-        self.relayer_attendance = 0
+        self.relayer_messages.clear()
+        self.relayer_messages_needed.clear()
+        self.sync_tick += 1
         self.runner_attendance = 0
         self.animal_locations = set()
         self.current_runner_locations = set()
 
         # respond to runners with relevant info
-        for sock in self.runner_connections:
-            if self.runner_within_range[sock]:
-                info = self.compile_info_for_runner(sock)
-                sock.send(info.encode("utf-8"))
+        targets = self.find_targets([id for id in self.runner_connections if self.runner_within_range[id]])
+        terrain = self.costliest_terrain(terrain_capacity(RUNNER_TRANSMISSION_SIZE_LIMIT))
+        for id, sock in self.runner_connections.items():
+            if self.runner_within_range[id]:
+                info = self.compile_info_for_runner(id, targets[id], terrain)
+                sock.send(info)
             else:
-                sock.send(TOO_FAR_AWAY.encode("utf-8"))
-
-    # encode terrain map by creating tuples for map positions that aren't blank
-    def encode_map(self):
-        map, coords = self.terrains.flatten().tolist(), self.coords.reshape(-1, 2).tolist()
-        return [(*coord, terrain) for terrain, coord in zip(map, coords) if terrain != BLANK_INDEX]
-
-    # info sent by relayer to a runner
-    # convention: id|treasure|target|animals|terrains
-    def compile_info_for_runner(self, sock):
-        target = self.find_target(sock)
-        # use standard prepare_info function to help compile some info and then rearrange using new schema
-        info = prepare_info(self.terrains, self.coords, self.animal_locations, self.treasure_location, 
-                            RUNNER_CODE, self.id, [target])
-        _, id, target, treasure, animals, terrain = info.split("|")
-        return "|".join([id, treasure, target, animals, terrain])
-
-    # find a target grid position that is close to the runner but hasn't yet been checked for treasure
-    def find_target(self, sock):
+                sock.send(encode_control(KIND_TOO_FAR_AWAY, id))
+
+    # up to n of the known terrain cells with the costliest terrain, as coords and codes, ties going to whichever
+    # was learned first
+    # goes through the knowledge log rather than the map, so it costs the same however big the map is
+    def costliest_terrain(self, n):
+        i, j = np.divmod(self.knowledge.cells[:len(self.knowledge)], MAP_DIMENSIONS[1])
+        codes = self.terrains[i, j]
+        order = np.argsort(-codes, kind = 'stable')[:n]
+        return np.stack([i[order], j[order]], axis = 1), codes[order]
+
+    # info sent by relayer to a runner (whose id it carries): the target as the only location, then treasure,
+    # animals and terrain (from costliest_terrain, which is the same for every runner)
+    def compile_info_for_runner(self, id, target, terrain):
+        message, _, _ = encode_report(KIND_ADVICE, id, [target], self.treasure_location, self.animal_locations,
+                                      *terrain, RUNNER_TRANSMISSION_SIZE_LIMIT)
+        return message
+
+    # find target grid positions that are close to each of the given runners but haven't yet been checked for treasure
+    # returns a dictionary from runner id to target
+    def find_targets(self, ids):
         if self.treasure_location is not None:
-            return self.treasure_location
-
-        # keep the same target if it hasn't been explored yet
-        if sock in self.existing_targets and (not self.checked_for_treasure[self.existing_targets[sock]]):
-            return self.existing_targets[sock]
-
-        i, j = self.runner_locations[sock]
-        # the furthest you can go (in terms of LINF norm) is the max distance to an edge of the map 
-        LINF_SWEEP_MAX = max(i, j, MAP_DIMENSIONS[0] - 1 - i, MAP_DIMENSIONS[1] - 1 - j)
-        # L-infinity norm is the appropriate norm for this game since the runners can move in all 8 directions
-        # iterate through grid positions near the runner by incrementing LINF norm
-        for LINF in range(LINF_SWEEP_MIN, LINF_SWEEP_MAX):
-            coords = []
-            # construct LINF box by creating each edge (top, left, bottom, right)
-            imin, imax = max(i - LINF, 0), min(i + LINF, MAP_DIMENSIONS[0] - 1)
-            jmin, jmax = max(j - LINF, 0), min(j + LINF, MAP_DIMENSIONS[1] - 1)
-            if i - LINF >= 0:
-                coords.extend([(i - LINF, j_) for j_ in range(jmin, jmax + 1)]) # top
-            if j - LINF >= 0:
-                coords.extend([(i_, j - LINF) for i_ in range(imin, imax + 1)]) # left
-            if i + LINF < MAP_DIMENSIONS[0]:
-                coords.extend([(i + LINF, j_) for j_ in range(jmin, jmax + 1)]) # bottom
-            if j + LINF < MAP_DIMENSIONS[1]:
-                coords.extend([(i_, j + LINF) for i_ in range(imin, imax + 1)]) # right
-            # see if any of the coords are unexplored
-            for coord in coords:
-                assert is_valid_location(coord), "this iteration should only include valid coordinates"
-                if not self.checked_for_treasure[coord]:
-                    self.existing_targets[sock] = coord
-                    return coord
-        raise Exception("Somehow every location on the map has been checked")
-
-    # parse incoming information from both runners and other relayers
-    def parse_info(self, data):
-        code, id, location_info, treasure, animals, terrains = data
-        if treasure:
-            self.treasure_location = eval(treasure)
+            return {id: self.treasure_location for id in ids}
+
+        targets = dict()
+        for id in ids:
+            # keep the same target if it hasn't been explored yet
+            if id in self.existing_targets and (not self.unchecked_cells.checked[self.existing_targets[id]]):
+                targets[id] = self.existing_targets[id]
+                continue
+            # L-infinity norm is the appropriate norm for this game since the runners can move in all 8 directions
+            # the closest unchecked position is searched for ring by ring, starting LINF_SWEEP_MIN away from the runner
+            coord = self.unchecked_cells.nearest(self.runner_locations[id], LINF_SWEEP_MIN)
+            if coord is None:
+                raise Exception("Somehow every location on the map has been checked")
+            self.existing_targets[id] = coord
+            targets[id] = coord
+        return targets
+
+    # parse an incoming report (decoded message) from either a runner or another relayer
+    # source is the id of the peer relayer it came from, if any
+    def parse_info(self, message, source = LOCAL_SOURCE):
+        if message.treasure:
+            self.treasure_location = message.treasure
 
         # update relayer animal mapping
-        if animals:
-            animals = animals.split('!')
-            for animal in animals:
-                self.animal_locations.add(eval(animal))
+        self.animal_locations.update(message.animals)
 
         # update relayer terrain mapping
-        if terrains:
-            terrains = terrains.split('!')
-            for terrain in terrains:
-                i, j, terrain_type = eval(terrain)
-                self.terrains[i][j] = terrain_type
-        # update checked_for_treasure grid based on runner location 
-        # mark all tiles within TREASURE_RADIUS as True
-        if location_info:
-            locations = location_info.split('!')
-            for location in locations:
-                i, j = eval(location)
-                self.current_runner_locations.add((i, j))
-                for i2 in range(i - TREASURE_RADIUS, i + TREASURE_RADIUS + 1):
-                    for j2 in range(j - TREASURE_RADIUS, j + TREASURE_RADIUS + 1):
-                        if is_valid_location((i2, j2)) and distance((i, j), (i2, j2)) <= TREASURE_RADIUS:
-                            self.checked_for_treasure[i2, j2] = True
-        if code == RUNNER_CODE:
-            return eval(location_info)
+        coords, codes = message.terrain
+        self.learn_terrain(coords[:, 0], coords[:, 1], codes, source)
+        # mark all tiles within TREASURE_RADIUS of each runner location as checked for treasure
+        self.current_runner_locations.update(message.locations)
+        if message.locations:
+            self.unchecked_cells.mark(*disk_cells(message.locations, TREASURE_RADIUS, MAP_DIMENSIONS))
 
 def main(seed, id):
+    # play with the same configuration as everyone else (see config.py)
+    apply_config(load_config())
     assert id < NUM_RELAYERS, "invalid id"
     relayer = Relayer(seed, id)
     try:
-        while True:
+        while not relayer.game_over:
             events = relayer.sel.select(timeout=None)
             for key, _ in events:
                 if key.data is None:
                     relayer.accept_wrapper(key.fileobj)
                 else:
                     relayer.service_connection(key)
+                if relayer.game_over:
+                    break
     except KeyboardInterrupt:
-        sys.exit()
+        pass
+    sys.exit()
 
 if __name__ == '__main__':
     assert len(sys.argv) == 3, "This program takes 2 required arguments: seed and id"
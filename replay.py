@@ -0,0 +1,133 @@
+import os
+import json
+import argparse
+import numpy as np
+
+from tracelog import *
+from codec import KIND_RUNNER_REPORT, KIND_RELAYER_REPORT, KIND_ADVICE
+from common import BLANK_INDEX
+
+# read-only view of a trace written by the engine (see tracelog.py)
+# every table is memory-mapped, so opening a trace costs the same however long the game was,
+# and any tick can be looked at directly without playing the game again
+class Replay:
+    def __init__(self, path):
+        with open(os.path.join(path, 'trace.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != TRACE_FORMAT_VERSION:
+            raise ValueError(f"Trace format version {meta['version']} is not {TRACE_FORMAT_VERSION}")
+        self.seed = meta['seed']
+        self.dims = tuple(meta['map_dimensions'])
+        self.index = load_table(path, INDEX_FILE, INDEX)
+        # the index is written last for each tick, so it also tells how many ticks made it into the trace
+        self.ticks = len(self.index)
+        self.tables = {table: load_table(path, table, dtype) for table, dtype in TABLES.items()}
+        self.terrain, self.relayer_locations, self.treasure = [np.load(os.path.join(path, f"{field}.npy"))
+                                                               for field in WORLD_FIELDS]
+
+    # rows of a table recorded during ticks [start, end)
+    def rows(self, table, start, end = None):
+        end = start + 1 if end is None else end
+        first = self.index[table][start - 1] if start > 0 else 0
+        last = self.index[table][end - 1] if end > 0 else 0
+        return self.tables[table][first:last]
+
+    def runners(self, tick):
+        return self.rows('runners', tick)
+
+    def animals(self, tick):
+        return self.rows('animals', tick)
+
+    def messages(self, tick):
+        return self.rows('messages', tick)
+
+    # what the given relayer (or every relayer between them, if None) knew by the end of tick
+    # as a map of terrain codes with -1 for unknown cells
+    def knowledge(self, tick, relayer = None):
+        rows = self.rows('knowledge', 0, tick + 1)
+        if relayer is not None:
+            rows = rows[rows['relayer'] == relayer]
+        known = np.full(self.dims[0] * self.dims[1], -1, dtype = np.int8)
+        known[rows['cell']] = rows['code']
+        return known.reshape(self.dims)
+
+    # one line describing a tick
+    def summary(self, tick):
+        runners, messages = self.runners(tick), self.messages(tick)
+        reports = np.isin(messages['kind'], (KIND_RUNNER_REPORT, KIND_RELAYER_REPORT, KIND_ADVICE))
+        dead, won = np.sum(runners['state'] == RUNNER_DEAD), np.sum(runners['state'] == RUNNER_WON)
+        return (f"tick {tick}: {len(runners)} runners ({dead} died, {won} won), {len(messages)} messages "
+                f"({reports.sum()} reports, {messages['size'].sum()} bytes), "
+                f"{np.count_nonzero(self.knowledge(tick) >= 0)} cells known")
+
+# draw ticks [start, end) of a replay the way the visualizer would, into a window or to export (see visualizer.py)
+def play(replay, start, end, export = None):
+    # imported here so that reading traces never needs matplotlib
+    import matplotlib.pyplot as plt
+    from visualizer import BlotLayer, FrameExporter, blot, color_map, interval
+    from visualizer import RELAYER_INDEX, ANIMAL_INDEX, RUNNER_INDEX
+
+    exporter = None
+    if export is not None:
+        plt.switch_backend('Agg')
+        exporter = FrameExporter(export)
+    true_base = replay.terrain.copy()
+    relayer_base = np.full(replay.dims, BLANK_INDEX, dtype = np.int8)
+    for loc in replay.relayer_locations:
+        true_base = blot(true_base, loc, RELAYER_INDEX)
+        relayer_base = blot(relayer_base, loc, RELAYER_INDEX)
+    true_layer, relayer_layer = BlotLayer(true_base), BlotLayer(relayer_base)
+    # seek: everything relayers learned before start goes in at once, later ticks add only what was new
+    known = replay.knowledge(start - 1) if start > 0 else np.full(replay.dims, -1, dtype = np.int8)
+    new = np.flatnonzero((relayer_base.ravel() == BLANK_INDEX) & (known.ravel() >= 0))
+    relayer_layer.set_background(new, known.ravel()[new])
+
+    fig, axes = plt.subplots(ncols = 2, figsize = (12, 8))
+    axes[0].set_title("True Game Map")
+    axes[1].set_title("Total Relayer Knowledge")
+    images = [ax.imshow(layer.map, cmap = color_map, vmin = -1, vmax = interval[1] - 1, aspect = 'equal',
+                        interpolation = 'none') for ax, layer in zip(axes, (true_layer, relayer_layer))]
+    if exporter is None:
+        plt.ion()
+    for tick in range(start, end):
+        rows = replay.rows('knowledge', tick)
+        new = relayer_layer.background.ravel()[rows['cell']] == BLANK_INDEX
+        relayer_layer.set_background(rows['cell'][new], rows['code'][new])
+        runners, animals = replay.runners(tick), replay.animals(tick)
+        runner_locations = np.stack([runners['i'], runners['j']], axis = 1)
+        true_map = true_layer.draw([(np.stack([animals['i'], animals['j']], axis = 1), ANIMAL_INDEX),
+                                    (runner_locations, RUNNER_INDEX)])
+        relayer_map = relayer_layer.draw([])
+        # the archive only needs the maps themselves
+        if exporter is not None and exporter.archive:
+            exporter.write(tick, fig, true_map, relayer_map)
+            continue
+        images[0].set_data(true_map)
+        images[1].set_data(relayer_map)
+        plt.suptitle(f"Adelphon (tick {tick})", fontsize = 28, y = 0.9)
+        if exporter is None:
+            plt.pause(0.01)
+        else:
+            fig.canvas.draw()
+            exporter.write(tick, fig, true_map, relayer_map)
+    if exporter is not None:
+        exporter.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Look at a game recorded with engine.py --trace")
+    parser.add_argument('trace')
+    parser.add_argument('tick', type = int, nargs = '?', help = "tick to describe or start playing from")
+    parser.add_argument('--play', action = 'store_true', help = "show the game from tick onwards")
+    parser.add_argument('--export', metavar = 'PATH', help = "write the frames from tick onwards to PATH instead "
+                        "(a directory of PNGs, or an archive of the raw maps if PATH ends in .npz)")
+    args = parser.parse_args()
+    replay = Replay(args.trace)
+    start = args.tick or 0
+    assert 0 <= start < replay.ticks, f"the trace has ticks 0 to {replay.ticks - 1}"
+    if args.play or args.export:
+        play(replay, start, replay.ticks, args.export)
+    elif args.tick is not None:
+        print(replay.summary(args.tick))
+    else:
+        for tick in range(replay.ticks):
+            print(replay.summary(tick))
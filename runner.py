@@ -1,110 +1,154 @@
 import sys
-import socket
 import numpy as np
-from queue import PriorityQueue
 
 from game import *
 from common import *
-from visualizer import BLANK_INDEX
+from transport import make_transport
+from planner import Planner
+from chunks import make_grid
+from config import apply_config, load_config
+from publisher import Publisher, connect_visualizer
 
 NEW_TARGET_RANGE = 8
+# cost of stepping off a cell with each terrain code: its wait time plus the step itself
+STEP_COSTS = np.array([WAIT_TIME_MAP[Terrain(code)] + 1 for code in range(len(Terrain))])
+# cells you haven't seen yet are assumed to be flat ground
+UNKNOWN_STEP_COST = 1
+# how runners choose which terrain cells fill their reports
+# 'classic' sends the cells in view, costliest terrain first, whether or not the relayers already have them
+# 'novelty' only sends cells the relayers haven't heard about yet, cells on the planned route first
+PACKING_MODES = ('classic', 'novelty')
+PACKING_MODE = 'novelty'
+assert PACKING_MODE in PACKING_MODES
+# how many cells ahead on the planned route get priority in reports
+ROUTE_PRIORITY_LENGTH = TERRAIN_RANGE
+
+# sorted array of unique values with values added, only shifting the existing ones rather than sorting them again
+def sorted_insert(array, values):
+    values = np.unique(np.asarray(values, dtype = np.int64))
+    at = np.searchsorted(array, values)
+    new = array[np.minimum(at, len(array) - 1)] != values if len(array) else np.ones(len(values), dtype = bool)
+    return np.insert(array, at[new], values[new])
+
+# sorted array with any of values that are in it taken out
+def sorted_remove(array, values):
+    if not len(array):
+        return array
+    values = np.asarray(values, dtype = np.int64)
+    at = np.minimum(np.searchsorted(array, values), len(array) - 1)
+    return np.delete(array, at[array[at] == values])
 
 class Runner:
-    def __init__(self, seed, id):
+    # host is the RunnerHost (or headless engine) this runner shares a game instance and connections with, if any
+    def __init__(self, seed, id, headless = False, host = None):
         self.id = id
-        self.game_instance = Game(seed)
-        print(f"Runner {self.id} is up and running")
+        self.headless = headless
+        self.game_instance = Game(seed) if host is None else host.game_instance
         self.alive = True
         self.won = False
+        # set once a relayer reports that the treasure has been found by another runner
+        self.game_over = False
         self.relayer_locations = []
         self.location = self.game_instance.runner_start_locations[self.id]
         self.wait_time = self.game_instance.runner_start_wait_times[self.id]
         self.treasure_location = None
-        self.terrains = np.full(MAP_DIMENSIONS, BLANK_INDEX, dtype=np.int8)
+        self.terrains = make_grid(MAP_DIMENSIONS, BLANK_INDEX, np.int8)
+        self.planner = Planner(MAP_DIMENSIONS)
+        # sorted flat indices of the cells whose terrain you know but the relayers might not, i.e. every known cell
+        # you haven't sent to a relayer or heard about from one
+        self.unreported = np.empty(0, dtype = np.int64)
+        self.route = []
         self.next_location = self.location # initialized this way because of how runner logic sequence works
         self.target_location = None
         self.animal_locations = set()
-        self.been_here = np.full(MAP_DIMENSIONS, False)
+        self.been_here = make_grid(MAP_DIMENSIONS, False, bool)
+        self.sockets = []
+        # the visualizer is optional, frames go nowhere unless setup_sockets finds one to connect to
+        self.publisher = Publisher()
+        # headless runners are wired up to an in-memory message bus by the engine instead
+        if not headless:
+            print(f"Runner {self.id} is up and running")
+            if host is None:
+                self.setup_sockets()
+            else:
+                self.sockets = host.mailboxes(self.id)
+                self.publisher = host.publisher
 
-        # socket setup
-        self.address = socket.gethostbyname(socket.gethostname())
-        self.sockets = [socket.socket(socket.AF_INET, socket.SOCK_STREAM) for _ in range(NUM_RELAYERS)]
-        for i in range(NUM_RELAYERS):
-            self.sockets[i].connect((self.address, PORT_START + i))
-        # socket for visualizer
-        self.visualizer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.visualizer_socket.connect((self.address, VISUALIZER_PORT))
+    def setup_sockets(self):
+        self.transport = make_transport()
+        self.sockets = [self.transport.connect(PORT_START + i, RUNNER_TRANSMISSION_SIZE_LIMIT)
+                        for i in range(NUM_RELAYERS)]
+        self.publisher = connect_visualizer(self.transport)
 
         # tell spawner that everything has been set up correctly
         alert_spawn_process()
 
-    # helper function to get the weight for an edge (v, u)
-    # in this case it's just the wait time of v
-    def get_weight(self, v):
-        # add one because you always need one timestep to just get there
-        return (WAIT_TIME_MAP[Terrain(self.terrains[v])] if self.terrains[v] != BLANK_INDEX else 0) + 1
-
-    # helper function to find the valid neighbors of a vertex
-    def neighbors(self, vertex):
-        i, j = vertex
-        potential = [(i + di, j + dj) for di in range(-1, 2) for dj in range(-1, 2)]
-        return [pair for pair in potential if is_valid_location(pair) and pair != vertex]
-
-    # given edge weights and a target location, run Dijkstra's algorithm with current location as the source
-    def dijkstra(self):
-        assert self.location != self.target_location, f"{self.id}"
-        # init data structures
-        dists = dict()
-        dists[self.target_location] = 0
-        next = dict()
-        visited = set()
-        # note that we won't be deleting elements or overwriting priority
-        # instead we'll be skipping elements with stale priorities
-        # e.g. if (1, u) was added to the queue after (2, u), then we'll skip the second occurrence
-        # this is tracked via the set visited
-        queue = PriorityQueue()
-        queue.put((0, self.target_location))
-
-        while True:
-            u = queue.get()[1]
-            # skip stale entries
-            if u in visited:
-                continue
-            visited.add(u)
-            # we've constructed a path from our current location to the target location so we're done
-            if u == self.location:
-                assert next[self.location] in self.neighbors(self.location)
-                return next[self.location]
-            for v in self.neighbors(u):
-                if v not in visited:
-                    alt_dist = self.get_weight(v) + dists[u]
-                    if (v not in dists) or (alt_dist < dists[v]):
-                        dists[v] = alt_dist
-                        next[v] = u
-                        queue.put((alt_dist, v))
+    # record terrain for the given cells and pass the step costs of any that changed on to the planner
+    def learn_terrain(self, i, j, codes):
+        changed = self.terrains[i, j] != codes
+        i, j, codes = i[changed], j[changed], codes[changed]
+        self.terrains[i, j] = codes
+        costs = np.where(codes == BLANK_INDEX, UNKNOWN_STEP_COST, STEP_COSTS[codes])
+        cells = (i * MAP_DIMENSIONS[1] + j).tolist()
+        self.planner.set_costs(cells, costs.tolist())
+        self.unreported = sorted_insert(self.unreported, cells)
+
+    # build a report that fills the byte budget with what the relayers don't know yet
+    # after your location and the treasure come the animals in view, since they move every timestep,
+    # then every known terrain cell that hasn't been reported: cells on the planned route first, then costliest first
+    # returns the message and the flat indices of the terrain cells that made it in
+    # a report never holds more than MAX_REPORT_TERRAIN cells, so only the first that many in that order get sorted
+    def compile_report(self, animals, treasure):
+        cells = self.unreported
+        codes = self.terrains[np.divmod(cells, MAP_DIMENSIONS[1])]
+        route = [r * MAP_DIMENSIONS[1] + c for r, c in self.route]
+        on_route = np.isin(cells, route)
+        # every cell gets its own key in that order (codes are int8, so 127 - code is in [0, 256))
+        keys = ((~on_route) * 256 + (127 - codes.astype(np.int64))) * (MAP_DIMENSIONS[0] * MAP_DIMENSIONS[1]) + cells
+        if len(keys) > MAX_REPORT_TERRAIN:
+            keys = np.partition(keys, MAX_REPORT_TERRAIN - 1)[:MAX_REPORT_TERRAIN]
+        cells = np.sort(keys) % (MAP_DIMENSIONS[0] * MAP_DIMENSIONS[1])
+        i, j = np.divmod(cells, MAP_DIMENSIONS[1])
+        codes = self.terrains[i, j]
+        message, _, n_terrain = encode_report(KIND_RUNNER_REPORT, self.id, [self.location], treasure, animals,
+                                              np.stack([i, j], axis = 1), codes, RUNNER_TRANSMISSION_SIZE_LIMIT)
+        return message, cells[:n_terrain]
 
     def one_step(self):
+        self.report()
+        if self.alive and not self.won:
+            self.plan()
+
+    # where you are this timestep: move on to the next location unless you're still waiting
+    def move(self):
         self.animal_locations = set() # reset set before getting new animal locations
         if self.wait_time == 0:
             self.location = self.next_location
 
         self.been_here[self.location] = True
-        # query the game map and update your own state
-        game_state = self.game_instance.query(self.location, is_runner = True)
+        return self.location
+
+    # first half of a timestep: move, query the game and send what you see to the relayers
+    # a host (see host.py) moves all of its runners and observes its shared game instance for all of them at once,
+    # then hands each runner its game_state
+    def report(self, game_state = None):
+        if game_state is None:
+            self.move()
+            # query the game map and update your own state
+            game_state = self.game_instance.query(self.location, is_runner = True)
         self.alive = game_state.alive
         self.won = game_state.won
 
         # game is over for this runner, tell all relayers and visualizer you've died/have won
         if (not self.alive) or self.won:
-            if not self.alive:
+            if not self.alive and not self.headless:
                 print("Runner " + str(self.id) + " has died")
-            if self.won:
+            if self.won and not self.headless:
                 print("Runner " + str(self.id) + " has won")
-            msg = '|'.join([RUNNER_CODE, str(self.id), (I_WON if self.won else IM_DEAD)])
+            msg = encode_control(KIND_I_WON if self.won else KIND_IM_DEAD, self.id)
             for i in range(NUM_RELAYERS):
-                self.sockets[i].send(msg.encode('utf-8'))
-            self.visualizer_socket.send(msg.encode('utf-8'))
-            self.visualizer_socket.recv(len(MESSAGE_RECEIVED))
+                self.sockets[i].send(msg)
+            self.publisher.publish(msg, wait = True)
             return
 
         # potentially start waiting if you're not already waiting
@@ -117,75 +161,84 @@ class Runner:
         self.animal_locations.update(animals)
         if treasure:
             self.treasure_location = treasure
-        i, j = coords[:,:,0], coords[:,:,1]
-        self.terrains[i, j] = terrains
-        relevant_info = prepare_info(terrains, coords, animals, treasure, RUNNER_CODE, self.id, [self.location])
+        self.learn_terrain(coords[:,:,0], coords[:,:,1], terrains)
+        if PACKING_MODE == 'novelty':
+            relevant_info, sent = self.compile_report(animals, treasure)
+        else:
+            relevant_info = prepare_info(terrains, coords, animals, treasure, RUNNER_CODE, self.id, [self.location])
 
         # send info to nearby relayers and a placeholder message to all others
+        in_range = self.game_instance.geometry.in_range(self.location)
+        too_far_away = encode_control(KIND_TOO_FAR_AWAY, self.id)
         for i in range(NUM_RELAYERS):
-            if distance(self.game_instance.relayer_locations[i], self.location) <= COMM_RADIUS:
-                self.sockets[i].send(relevant_info.encode('utf-8'))
-            else:
-                self.sockets[i].send(TOO_FAR_AWAY.encode('utf-8'))
-        self.visualizer_socket.sendall((RUNNER_CODE + "|" + str(self.location)).encode("utf-8"))
-        self.visualizer_socket.recv(len(MESSAGE_RECEIVED))
-    
+            self.sockets[i].send(relevant_info if in_range[i] else too_far_away)
+        if PACKING_MODE == 'novelty' and in_range.any():
+            self.unreported = sorted_remove(self.unreported, sent)
+        if self.publisher.connected:
+            self.publisher.publish(encode_runner_frame(self.id, self.game_instance.game_clock, self.location))
+
+    # second half of a timestep: take in the relayers' responses and plan the next move
+    def plan(self):
         # logic for receiving relayer responses
         already_received_response = False
         for i in range(NUM_RELAYERS):
-            recv_data = self.sockets[i].recv(RUNNER_TRANSMISSION_SIZE_LIMIT)
+            recv_data = self.sockets[i].recv()
             if not recv_data:
                 raise ConnectionError(f"Lost connection to relayer {i}")
-            data = recv_data.decode("utf-8")
+            message = decode(recv_data)
 
-            # exit once you've heard that you've won from a relayer
-            if data == WE_WON:
-                sys.exit()
+            # stop once you've heard that you've won from a relayer
+            if message.kind == KIND_WE_WON:
+                self.game_over = True
+                return
             # too far away message should only ever be echoed i.e. you shouldn't ever hear
             #  it from a relayer that is close enough
-            elif data == TOO_FAR_AWAY:
-                assert distance(self.game_instance.relayer_locations[i], self.location) > COMM_RADIUS
+            elif message.kind == KIND_TOO_FAR_AWAY:
+                assert not self.game_instance.geometry.in_range(self.location)[i]
             elif not already_received_response:
+                assert message.kind == KIND_ADVICE, f"unexpected message kind {message.kind} from relayer {i}"
                 already_received_response = True
-                _, treasure, target, animals, terrain = data.split("|")
                 # parse info from relayer
-                assert target, "relayer should always send a valid target"
-                target = eval(target)
+                assert message.locations, "relayer should always send a valid target"
+                target = message.locations[0]
                 # reject target locations you've already been to
                 if not self.been_here[target]:
                     self.target_location = target
-                if animals:
-                    self.animal_locations.update([eval(a) for a in animals.split('!')])
-                if treasure:
-                    self.treasure_location = eval(treasure)
-                if terrain:
-                    for terra in terrain.split('!'):
-                        i, j, terrain_type = eval(terra)
-                        self.terrains[i][j] = terrain_type
+                self.animal_locations.update(message.animals)
+                if message.treasure:
+                    self.treasure_location = message.treasure
+                coords, codes = message.terrain
+                self.learn_terrain(coords[:, 0], coords[:, 1], codes)
+                self.unreported = sorted_remove(self.unreported, coords[:, 0] * MAP_DIMENSIONS[1] + coords[:, 1])
 
         # only set a new target if you don't have one or if you're already there
         if (not self.target_location) or (self.target_location == self.location):
             i, j = self.location
             new_target = self.location
+            # this runner's own stream, so its choices never depend on what anyone else draws
+            rng = self.game_instance.rng(RUNNER_STREAM + self.id)
             # randomly go towards edges of map; retry in case you go off the map
             while new_target == self.location:
                 options = [NEW_TARGET_RANGE, -NEW_TARGET_RANGE]
                 # random movement that's biased towards center if you're on edges and fair coin toss in middle
-                di = np.random.choice(options, p = np.array([MAP_DIMENSIONS[0] - 1 - i, i]) / (MAP_DIMENSIONS[0] - 1))
-                dj = np.random.choice(options, p = np.array([MAP_DIMENSIONS[1] - 1 - j, j]) / (MAP_DIMENSIONS[1] - 1))
+                di = rng.choice(options, p = np.array([MAP_DIMENSIONS[0] - 1 - i, i]) / (MAP_DIMENSIONS[0] - 1))
+                dj = rng.choice(options, p = np.array([MAP_DIMENSIONS[1] - 1 - j, j]) / (MAP_DIMENSIONS[1] - 1))
                 new_target = clip_location((i + di, j + dj))
             self.target_location = new_target
         # target should always be treasure if you know where it is
         if self.treasure_location:
             self.target_location = self.treasure_location
-        self.next_location = self.dijkstra()
+        self.next_location = self.planner.next_step(self.location, self.target_location)
+        self.route = self.planner.route(self.location, ROUTE_PRIORITY_LENGTH)
 
 def main(seed, id):
+    # play with the same configuration as everyone else (see config.py)
+    apply_config(load_config())
     runner = Runner(seed, id)
     try:
         while True:
             runner.one_step()
-            if (not runner.alive) or runner.won:
+            if (not runner.alive) or runner.won or runner.game_over:
                 break
     except KeyboardInterrupt:
         sys.exit()
@@ -0,0 +1,153 @@
+import heapq
+from collections import defaultdict
+import numpy as np
+
+from chunks import make_grid
+
+# nearest queries first look for an answer in the window this many cells around the location, which is
+# where it usually is until most of the map is checked, and only search the pyramid if that comes up empty
+LOCAL_RADIUS = 8
+
+# counts of checked cells kept at every scale of the map so that the nearest unchecked cell can be found
+# without scanning: level 0 is one cell per entry and each level above sums 2x2 blocks of the one below,
+# up to a single entry for the whole map
+# a block is worth searching while its count is below the number of cells in it, and since almost every
+# count starts (and for big maps stays) at zero, the levels are grids that only store the parts in use
+# marking cells only walks their one entry per level
+class UncheckedIndex:
+    def __init__(self, dims):
+        self.dims = dims
+        self.checked = make_grid(dims, False, bool)
+        self.levels = [make_grid(dims, 0, np.int64)]
+        while self.levels[-1].shape != (1, 1):
+            rows, cols = self.levels[-1].shape
+            self.levels.append(make_grid((-(-rows // 2), -(-cols // 2)), 0, np.int64))
+        offsets = np.arange(-LOCAL_RADIUS, LOCAL_RADIUS + 1)
+        self.local_distances = np.maximum(np.abs(offsets)[:, None], np.abs(offsets)[None, :])
+
+    def remaining(self):
+        return self.dims[0] * self.dims[1] - int(self.levels[-1][0, 0])
+
+    # mark the cells with the given row and column indices as checked
+    def mark(self, i, j):
+        i, j = np.asarray(i), np.asarray(j)
+        cells = np.unique(np.ravel_multi_index((i.ravel(), j.ravel()), self.dims))
+        i, j = np.unravel_index(cells, self.dims)
+        new = ~self.checked[i, j]
+        i, j = i[new], j[new]
+        self.checked[i, j] = True
+        for level, counts in enumerate(self.levels):
+            blocks, added = np.unique((i >> level) * counts.shape[1] + (j >> level), return_counts = True)
+            bi, bj = np.divmod(blocks, counts.shape[1])
+            counts[bi, bj] = counts[bi, bj] + added
+
+    # L-infinity distance from (i, j) to the closest unchecked cell at least min_distance away, or None
+    def nearest_distance(self, location, min_distance):
+        i, j = location
+        rows, cols = self.dims
+        i0, i1 = max(i - LOCAL_RADIUS, 0), min(i + LOCAL_RADIUS + 1, rows)
+        j0, j1 = max(j - LOCAL_RADIUS, 0), min(j + LOCAL_RADIUS + 1, cols)
+        distances = self.local_distances[i0 - i + LOCAL_RADIUS:i1 - i + LOCAL_RADIUS,
+                                         j0 - j + LOCAL_RADIUS:j1 - j + LOCAL_RADIUS]
+        candidates = distances[~self.checked[i0:i1, j0:j1] & (distances >= min_distance)]
+        if len(candidates):
+            return int(candidates.min())
+
+        heap = [(0, len(self.levels) - 1, 0, 0)]
+        while heap:
+            bound, level, bi, bj = heapq.heappop(heap)
+            if level == 0:
+                return bound
+            child = level - 1
+            counts = self.levels[child]
+            for ci in (2 * bi, 2 * bi + 1):
+                for cj in (2 * bj, 2 * bj + 1):
+                    if ci >= counts.shape[0] or cj >= counts.shape[1]:
+                        continue
+                    # rows and columns covered by the child block
+                    i0, i1 = ci << child, min(((ci + 1) << child) - 1, rows - 1)
+                    j0, j1 = cj << child, min(((cj + 1) << child) - 1, cols - 1)
+                    # every cell of the block is checked
+                    if counts[ci, cj] == (i1 - i0 + 1) * (j1 - j0 + 1):
+                        continue
+                    # every cell of the block is too close
+                    if max(i - i0, i1 - i, j - j0, j1 - j) < min_distance:
+                        continue
+                    near = max(i0 - i, 0, i - i1, j0 - j, 0, j - j1)
+                    heapq.heappush(heap, (max(near, min_distance), child, ci, cj))
+        return None
+
+    # first unchecked cell on the L-infinity ring of the given radius around (i, j), going along
+    # the top, left, bottom and right edges in that order, or None if the ring is all checked
+    def first_on_ring(self, location, radius):
+        i, j = location
+        rows, cols = self.dims
+        irange = np.arange(max(i - radius, 0), min(i + radius, rows - 1) + 1)
+        jrange = np.arange(max(j - radius, 0), min(j + radius, cols - 1) + 1)
+        edges = []
+        if i - radius >= 0:
+            edges.append((np.full(len(jrange), i - radius), jrange)) # top
+        if j - radius >= 0:
+            edges.append((irange, np.full(len(irange), j - radius))) # left
+        if i + radius < rows:
+            edges.append((np.full(len(jrange), i + radius), jrange)) # bottom
+        if j + radius < cols:
+            edges.append((irange, np.full(len(irange), j + radius))) # right
+        if not edges:
+            return None
+        ring_i = np.concatenate([edge[0] for edge in edges])
+        ring_j = np.concatenate([edge[1] for edge in edges])
+        unchecked = ~self.checked[ring_i, ring_j]
+        if not unchecked.any():
+            return None
+        first = unchecked.argmax()
+        return (int(ring_i[first]), int(ring_j[first]))
+
+    # closest unchecked cell to location in L-infinity distance, ignoring anything closer than min_distance
+    # ties within a ring are broken in the order of first_on_ring
+    def nearest(self, location, min_distance = 0):
+        radius = self.nearest_distance(location, min_distance)
+        return None if radius is None else self.first_on_ring(location, radius)
+
+# points (e.g. the animals) bucketed into a uniform grid of size x size squares, so that finding the points within
+# some radius of up to size of a location only looks at the 3x3 buckets around it instead of at every point
+# buckets are keyed by a flat bucket number with a spare column, so that stepping one bucket off either side
+# of the map lands on a key that is never used instead of wrapping around to the other side
+# moving the points only touches the ones that crossed into another bucket
+class SpatialHash:
+    def __init__(self, points, size, dims):
+        self.size = size
+        self.stride = -(-dims[1] // size) + 1
+        self.neighbors = [di * self.stride + dj for di in (-1, 0, 1) for dj in (-1, 0, 1)]
+        self.points = np.asarray(points, dtype = np.int64).reshape(-1, 2)
+        self.keys = self.bucket_keys(self.points)
+        self.buckets = defaultdict(set)
+        for point, key in enumerate(self.keys.tolist()):
+            self.buckets[key].add(point)
+
+    def bucket_keys(self, locations):
+        return (locations[:, 0] // self.size) * self.stride + locations[:, 1] // self.size
+
+    # points is the new location of every point, in the same order as before
+    def move(self, points):
+        points = np.asarray(points, dtype = np.int64).reshape(-1, 2)
+        keys = self.bucket_keys(points)
+        moved = np.flatnonzero(keys != self.keys)
+        for point, old, new in zip(moved.tolist(), self.keys[moved].tolist(), keys[moved].tolist()):
+            bucket = self.buckets[old]
+            bucket.discard(point)
+            if not bucket:
+                del self.buckets[old]
+            self.buckets[new].add(point)
+        self.points, self.keys = points, keys
+
+    # (location, point) index pairs of every location with every point in the buckets around it,
+    # sorted by location and then by point, which covers every point within size of each location
+    def candidates(self, locations):
+        locations = np.asarray(locations, dtype = np.int64).reshape(-1, 2)
+        near_location, near_point = [], []
+        for k, key in enumerate(self.bucket_keys(locations).tolist()):
+            points = sorted(point for neighbor in self.neighbors for point in self.buckets.get(key + neighbor, ()))
+            near_location.extend([k] * len(points))
+            near_point.extend(points)
+        return np.array(near_location, dtype = np.int64), np.array(near_point, dtype = np.int64)
@@ -1,48 +1,88 @@
 import numpy as np
-import sys
-import socket
-import subprocess, signal
-import time
+import argparse
+import subprocess
 
-from game import NUM_RELAYERS, NUM_RUNNERS
+from game import Game, NUM_RELAYERS, NUM_RUNNERS
 from common import SPAWN_PORT, IM_UP
+from transport import make_transport
+from publisher import LOSSLESS_ENV
+from config import add_config_arguments, config_from_args, apply_config, current_config, config_env
 
-def main(seed):
+# export is passed on to the visualizer (see visualizer.py)
+# config (a RunConfig, see config.py) defaults to the one in the source and is passed on to every child
+# with runners_per_host above 1, runners are started that many to a process (see host.py)
+def main(seed, visualize = True, export = None, config = None, runners_per_host = 1):
+    config = current_config() if config is None else config
+    apply_config(config)
+    env = config_env(config)
+    # an exported game should have every frame in it, not just the ones the visualizer kept up with
+    if visualize and export is not None:
+        env[LOSSLESS_ENV] = '1'
+    # build the static world once up front, every child process then attaches to the cached copy
+    Game(seed)
     # wait for a connection from each process before spawning the next one
     # each connection will be at the end of the process's init function
     # this will prevent processes from getting ahead of each other and causing connection errors
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.bind((socket.gethostbyname(socket.gethostname()), SPAWN_PORT))
-    sock.listen()
+    transport = make_transport()
+    sock = transport.listen(SPAWN_PORT)
     child_processes = []
-    child_processes.append(subprocess.Popen(["python", "visualizer.py", str(seed)]))
-    wait_for_connection(sock, "visualizer")
+    # the visualizer only watches, the game runs the same (and as fast as it can) without one
+    if visualize:
+        export_args = ["--export", export] if export is not None else []
+        child_processes.append(subprocess.Popen(["python", "visualizer.py", str(seed), *export_args], env = env))
+        wait_for_connection(transport, sock, "visualizer")
     for i in range(NUM_RELAYERS):
-        child_processes.append(subprocess.Popen(["python", "relayer.py", str(seed), str(i)]))
-        wait_for_connection(sock, f"relayer {i}")
-    for i in range(NUM_RUNNERS):
-        child_processes.append(subprocess.Popen(["python", "runner.py", str(seed), str(i)]))
-        wait_for_connection(sock, f"runner {i}")
+        child_processes.append(subprocess.Popen(["python", "relayer.py", str(seed), str(i)], env = env))
+        wait_for_connection(transport, sock, f"relayer {i}")
+    if runners_per_host == 1:
+        for i in range(NUM_RUNNERS):
+            child_processes.append(subprocess.Popen(["python", "runner.py", str(seed), str(i)], env = env))
+            wait_for_connection(transport, sock, f"runner {i}")
+    else:
+        for first in range(0, NUM_RUNNERS, runners_per_host):
+            count = min(runners_per_host, NUM_RUNNERS - first)
+            child_processes.append(subprocess.Popen(["python", "host.py", str(seed), str(first), str(count)], env = env))
+            wait_for_connection(transport, sock, f"runners {first} to {first + count - 1}")
     sock.close()
 
-    # cycle so that you can accept KeyboardInterrupts and pass them down to child processes
-    while True:
-        pass
+    # every process leaves once the game is over for it, the visualizer once everyone else has
+    # a KeyboardInterrupt reaches the children too, so just carry on waiting for them to finish
+    for process in child_processes:
+        while True:
+            try:
+                process.wait()
+                break
+            except KeyboardInterrupt:
+                pass
 
 # helper function to wait for a single connection to the given socket
-def wait_for_connection(sock, process_name):
-    conn, _ = sock.accept()
-    if not conn.recv(len(IM_UP)):
+def wait_for_connection(transport, sock, process_name):
+    conn, _ = transport.accept(sock, len(IM_UP))
+    if not conn.recv():
         raise ConnectionError(f"Invalid connection from {process_name}")
     conn.close()
 
 if __name__ == '__main__':
-    assert len(sys.argv) <= 2, \
-        "This program only takes in one optional argument: seed (a seed will be chosen randomly if not provided)"
-    if len(sys.argv) == 2:
-        main(int(sys.argv[1]))
-    else:
+    parser = argparse.ArgumentParser(description = "Play a game of Adelphon with every runner and relayer in its own process")
+    parser.add_argument('seed', type = int, nargs = '?',
+                        help = "a seed will be chosen randomly if not provided, use it to rerun the same game scenario")
+    parser.add_argument('--no-visualizer', dest = 'visualize', action = 'store_false',
+                        help = "play the game without a visualizer")
+    parser.add_argument('--export', metavar = 'PATH',
+                        help = "have the visualizer write frames to PATH instead of showing them (see visualizer.py)")
+    parser.add_argument('--runners-per-host', type = int, default = 1, metavar = 'N',
+                        help = "run the runners N to a process, sharing a game instance and connections")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    assert args.runners_per_host >= 1, "--runners-per-host must be at least 1"
+    assert args.visualize or args.export is None, "--export needs the visualizer"
+    try:
+        config = config_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    seed = args.seed
+    if seed is None:
         max_int = np.iinfo(np.int32).max
         seed = np.random.randint(max_int)
         print(f"This run uses the seed {seed}")
-        main(seed)
\ No newline at end of file
+    main(seed, args.visualize, args.export, config, args.runners_per_host)
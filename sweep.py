@@ -0,0 +1,128 @@
+import os
+import argparse
+import itertools
+import multiprocessing
+from collections import OrderedDict
+import numpy as np
+
+import game
+import runner
+from engine import HeadlessGame
+from config import set_constants, apply_config, current_config, validate_config, CONFIG_CONSTANTS
+
+# sweepable constants and the command line flags that set them
+SWEEP_PARAMS = OrderedDict([
+    ('NUM_RUNNERS', '--runners'),
+    ('NUM_RELAYERS', '--relayers'),
+    ('COMM_RADIUS', '--comm-radius'),
+    ('NUM_ANIMALS', '--animals'),
+    ('NEW_TARGET_RANGE', '--target-range'),
+])
+RESULT_FIELDS = ['won', 'ticks', 'deaths', 'messages', 'bytes', 'wall_time']
+DEFAULT_MAX_TICKS = 5000
+
+# RunConfig field set by each constant that is part of the run configuration (see config.py)
+CONFIG_FIELDS = {constant: field for field, constant in CONFIG_CONSTANTS.items()}
+
+# the run configuration for params on top of the current one, and the params that aren't part of it
+# raises a ValueError if the configuration is invalid
+def params_config(params):
+    config = current_config()._replace(**{CONFIG_FIELDS[param]: value for param, value in params.items()
+                                          if param in CONFIG_FIELDS})
+    other = {param: value for param, value in params.items() if param not in CONFIG_FIELDS}
+    if other.get('NEW_TARGET_RANGE', 1) < 1:
+        raise ValueError(f"NEW_TARGET_RANGE must be at least 1, got {other['NEW_TARGET_RANGE']}")
+    return validate_config(config), other
+
+# point every module's copy of the given constants at the given values, without checking them (see config.py)
+# benchmarks use this to go past what a real run configuration allows, e.g. maps too big for the wire format
+def apply_params(params):
+    set_constants(params)
+
+# pool worker: play one headless game and return its row for the results file
+def run_game(task):
+    seed, params, max_ticks = task
+    config, other = params_config(params)
+    apply_config(config)
+    apply_params(other)
+    result = HeadlessGame(seed).run(max_ticks)
+    result = result._replace(won = int(result.won))
+    return dict(seed = seed, **params, **{field: getattr(result, field) for field in RESULT_FIELDS})
+
+# every (seed, params) combination in the sweep
+# every combination is checked up front, so a bad one fails the sweep before any game is played
+def build_tasks(seeds, grids, max_ticks):
+    combos = [OrderedDict(zip(grids.keys(), values)) for values in itertools.product(*grids.values())]
+    for combo in combos:
+        try:
+            params_config(combo)
+        except ValueError as e:
+            raise ValueError(f"invalid sweep combination {dict(combo)}: {e}") from None
+    return [(seed, combo, max_ticks) for combo in combos for seed in seeds]
+
+# write results (a dict of equal length columns) to path as one array per field
+# the file is replaced in one step, so a reader never sees a partly written one
+def save_results(path, results):
+    partial = path + '.partial.npz'
+    np.savez(partial, **{field: np.array(column) for field, column in results.items()})
+    os.replace(partial, path)
+
+# load a results file into a dict of numpy columns
+def load_results(path):
+    with np.load(path) as results:
+        columns = {field: results[field] for field in results.files}
+    return columns if len(columns.get('seed', [])) else {}
+
+# print per parameter combination statistics for a results file
+def summarize(path):
+    results = load_results(path)
+    if not results:
+        print("No results")
+        return
+    keys = list(zip(*[results[param] for param in SWEEP_PARAMS]))
+    print(' '.join(f"{param:>16}" for param in SWEEP_PARAMS) +
+          f" {'games':>6} {'win rate':>8} {'ticks (won)':>11} {'deaths':>7} {'messages':>9} {'bytes':>10} {'wall (s)':>9}")
+    for key in sorted(set(keys)):
+        mask = np.array([k == key for k in keys])
+        won = mask & (results['won'] == 1)
+        ticks = np.median(results['ticks'][won]) if won.any() else float('nan')
+        print(' '.join(f"{int(value):>16}" for value in key) +
+              f" {mask.sum():>6} {won.sum() / mask.sum():>8.2f} {ticks:>11.1f} {results['deaths'][mask].mean():>7.2f}"
+              f" {results['messages'][mask].mean():>9.0f} {results['bytes'][mask].mean():>10.0f}"
+              f" {results['wall_time'][mask].mean():>9.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Play many headless games across seeds and parameter grids")
+    parser.add_argument('first_seed', type = int)
+    parser.add_argument('last_seed', type = int, help = "inclusive")
+    defaults = dict(NUM_RUNNERS = game.NUM_RUNNERS, NUM_RELAYERS = game.NUM_RELAYERS, COMM_RADIUS = game.COMM_RADIUS,
+                    NUM_ANIMALS = game.NUM_ANIMALS, NEW_TARGET_RANGE = runner.NEW_TARGET_RANGE)
+    for param, flag in SWEEP_PARAMS.items():
+        parser.add_argument(flag, dest = param, default = str(defaults[param]),
+                            help = f"comma separated values for {param} (default {defaults[param]})")
+    parser.add_argument('--out', default = 'sweep_results.npz',
+                        help = "results file, an .npz of one array per field with an entry per game")
+    parser.add_argument('--max-ticks', type = int, default = DEFAULT_MAX_TICKS, help = "give up on a game after this")
+    parser.add_argument('--workers', type = int, default = os.cpu_count())
+    args = parser.parse_args()
+    assert args.first_seed <= args.last_seed, "the seed range is empty"
+
+    grids = OrderedDict((param, [int(v) for v in getattr(args, param).split(',')]) for param in SWEEP_PARAMS)
+    try:
+        tasks = build_tasks(range(args.first_seed, args.last_seed + 1), grids, args.max_ticks)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Playing {len(tasks)} games on {args.workers} workers")
+    # write the results out again as each game finishes so a partial sweep is still usable
+    results = {field: [] for field in ['seed', *SWEEP_PARAMS, *RESULT_FIELDS]}
+    with multiprocessing.Pool(args.workers) as pool:
+        for done, row in enumerate(pool.imap_unordered(run_game, tasks), 1):
+            for field, column in results.items():
+                column.append(row[field])
+            save_results(args.out, results)
+            print(f"\r{done}/{len(tasks)} games", end = '', flush = True)
+    print()
+    summarize(args.out)
+
+if __name__ == '__main__':
+    main()
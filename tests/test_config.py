@@ -0,0 +1,41 @@
+import pytest
+
+from config import apply_config, current_config, validate_config, set_constants
+import game
+
+@pytest.fixture
+def restore_config():
+    original = current_config()
+    yield
+    apply_config(original)
+
+def test_default_config_is_valid():
+    validate_config(current_config())
+
+def test_rejects_relayers_that_dont_fit_the_map():
+    config = current_config()._replace(map_dimensions = (10, 10), num_relayers = 100)
+    with pytest.raises(ValueError, match = "relayers don't fit"):
+        validate_config(config)
+
+# on a small map, every relayer count validate_config accepts can be placed and every one it rejects can't
+def test_accepted_relayer_counts_can_be_placed(restore_config):
+    for num_relayers in range(1, 50):
+        config = current_config()._replace(map_dimensions = (10, 10), num_relayers = num_relayers)
+        try:
+            validate_config(config)
+            accepted = True
+        except ValueError:
+            accepted = False
+        set_constants(dict(MAP_DIMENSIONS = (10, 10), NUM_RELAYERS = num_relayers))
+        try:
+            placed = len(game.Game.__new__(game.Game).relayer_init(game.game_rng(10, 0, 0))) == num_relayers
+        except ValueError:
+            placed = False
+        assert accepted == placed, f"{num_relayers} relayers: accepted {accepted}, placed {placed}"
+
+# constants reach modules that aren't imported by name anywhere in config.py
+def test_apply_config_reaches_every_module(restore_config):
+    import host, runner
+    apply_config(current_config()._replace(num_runners = 3, map_dimensions = (60, 60)))
+    assert host.NUM_RUNNERS == runner.NUM_RUNNERS == game.NUM_RUNNERS == 3
+    assert runner.MAP_DIMENSIONS == (60, 60)
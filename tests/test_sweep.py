@@ -0,0 +1,17 @@
+from collections import OrderedDict
+import pytest
+
+from sweep import build_tasks
+
+def test_build_tasks_rejects_invalid_combinations_up_front():
+    grids = OrderedDict(NUM_RELAYERS = [5, 40000], COMM_RADIUS = [20])
+    with pytest.raises(ValueError, match = "relayers don't fit"):
+        build_tasks(range(10, 12), grids, 100)
+    with pytest.raises(ValueError, match = "comm_radius"):
+        build_tasks(range(10, 12), OrderedDict(COMM_RADIUS = [0]), 100)
+
+def test_build_tasks_covers_every_seed_and_combination():
+    tasks = build_tasks(range(10, 12), OrderedDict(NUM_RUNNERS = [4, 8], COMM_RADIUS = [20]), 100)
+    assert [(seed, dict(params)) for seed, params, _ in tasks] == [
+        (10, dict(NUM_RUNNERS = 4, COMM_RADIUS = 20)), (11, dict(NUM_RUNNERS = 4, COMM_RADIUS = 20)),
+        (10, dict(NUM_RUNNERS = 8, COMM_RADIUS = 20)), (11, dict(NUM_RUNNERS = 8, COMM_RADIUS = 20))]
@@ -0,0 +1,83 @@
+import os
+
+# how relayers share what they know with each other every timestep, every relayer in a game must use the same one
+# 'all' sends to every other relayer (the original mesh: R - 1 connections per relayer and R * (R - 1) messages)
+# 'tree' reduces up a spanning tree to relayer 0 and broadcasts back down (2 * (R - 1) messages, 2 * depth hops)
+# 'ring' passes everything around a ring R - 1 times (2 connections per relayer but R * (R - 1) messages)
+# 'gossip' sends to 2 peers a power of two away, cycling through the powers over timesteps (2 * R messages,
+#  1 hop, but news takes log2(R) timesteps to reach everyone)
+TOPOLOGIES = ('all', 'tree', 'ring', 'gossip')
+# can be overridden per run with the ADELPHON_TOPOLOGY environment variable, which child processes inherit
+TOPOLOGY = os.environ.get('ADELPHON_TOPOLOGY', 'all')
+assert TOPOLOGY in TOPOLOGIES
+# children per relayer in the 'tree' topology
+TREE_FANOUT = 2
+
+# build the topology selected by name (defaults to TOPOLOGY) for a network of the given number of relayers
+def make_topology(num_relayers, name = None):
+    name = TOPOLOGY if name is None else name
+    if name == 'all':
+        return AllToAll(num_relayers)
+    elif name == 'tree':
+        return SpanningTree(num_relayers)
+    elif name == 'ring':
+        return Ring(num_relayers)
+    elif name == 'gossip':
+        return Gossip(num_relayers)
+    raise ValueError(f"Unknown topology: {name}")
+
+# a relayer's sync for one timestep is a list of stages: in each one it sends its info to some peers and then
+# waits for a message from each of some peers before moving on to the next stage
+# every message a relayer is sent during a timestep is waited for in one of its stages, so timesteps never mix
+class Topology:
+    def __init__(self, num_relayers):
+        self.num_relayers = num_relayers
+
+    # ids of every relayer that id ever exchanges messages with, which is who it needs connections to
+    def neighbors(self, id):
+        peers = set()
+        for tick in range(self.period()):
+            for send_to, wait_for in self.stages(id, tick):
+                peers.update(send_to)
+                peers.update(wait_for)
+        return sorted(peers)
+
+    # stages repeat after this many timesteps
+    def period(self):
+        return 1
+
+    # list of (send_to, wait_for) pairs of relayer id lists
+    def stages(self, id, tick):
+        raise NotImplementedError
+
+class AllToAll(Topology):
+    def stages(self, id, tick):
+        others = [peer for peer in range(self.num_relayers) if peer != id]
+        return [(others, others)]
+
+# relayer 0 is the root and the children of relayer i are TREE_FANOUT * i + 1 onwards
+class SpanningTree(Topology):
+    def stages(self, id, tick):
+        parent = [(id - 1) // TREE_FANOUT] if id > 0 else []
+        children = list(range(TREE_FANOUT * id + 1, min(TREE_FANOUT * (id + 1) + 1, self.num_relayers)))
+        # gather from the children, pass the union up, then hear everything back from the parent and pass it down
+        return [([], children), (parent, parent), (children, [])]
+
+class Ring(Topology):
+    def stages(self, id, tick):
+        if self.num_relayers == 1:
+            return []
+        next, previous = [(id + 1) % self.num_relayers], [(id - 1) % self.num_relayers]
+        # after R - 1 passes every relayer has heard (through the others) from everyone
+        return [(next, previous)] * (self.num_relayers - 1)
+
+# on timestep t, relayer i sends to i + 2^k and i - 2^k and hears from the same two, with k = t mod log2(R)
+# so anything a relayer knows has reached every other relayer after log2(R) timesteps
+class Gossip(Topology):
+    def period(self):
+        return max(1, (self.num_relayers - 1).bit_length())
+
+    def stages(self, id, tick):
+        step = 1 << (tick % self.period())
+        peers = sorted({(id + step) % self.num_relayers, (id - step) % self.num_relayers} - {id})
+        return [(peers, peers)]
@@ -0,0 +1,92 @@
+import os
+import json
+import numpy as np
+
+from game import Game
+from common import MAP_DIMENSIONS
+
+# bump whenever a table's layout changes so old traces are never misread
+TRACE_FORMAT_VERSION = 1
+
+# a trace is a directory with one flat binary file of fixed size records per table, appended to every tick,
+# so any of them can be memory-mapped straight back with np.memmap and sliced without parsing
+# ticks count the engine's timesteps from 0
+RUNNER_ALIVE, RUNNER_DEAD, RUNNER_WON = 0, 1, 2
+ROLE_RUNNER, ROLE_RELAYER = 0, 1
+TABLES = dict(
+    # every runner still playing at the start of a tick, where it ended up and how the tick ended for it
+    runners = np.dtype([('tick', '<u4'), ('runner', '<u2'), ('i', '<u2'), ('j', '<u2'), ('state', 'u1')]),
+    # every animal at the end of a tick
+    animals = np.dtype([('tick', '<u4'), ('animal', '<u2'), ('i', '<u2'), ('j', '<u2')]),
+    # every message sent during a tick: its kind (see codec.py), who sent it to whom and its size in bytes
+    messages = np.dtype([('tick', '<u4'), ('kind', 'u1'), ('sender_role', 'u1'), ('sender', '<u2'),
+                         ('receiver_role', 'u1'), ('receiver', '<u2'), ('size', '<u2')]),
+    # terrain cells (flat indices) each relayer learned during a tick and their codes
+    knowledge = np.dtype([('tick', '<u4'), ('relayer', '<u2'), ('cell', '<u4'), ('code', 'i1')]),
+)
+# one record per tick with how many rows every table has once that tick is done, so seeking is two lookups
+INDEX = np.dtype([(table, '<u8') for table in TABLES])
+INDEX_FILE = 'ticks'
+# the static parts of the world, saved alongside so a trace can be replayed on its own
+WORLD_FIELDS = ('terrain', 'relayer_locations', 'treasure')
+
+def table_path(path, table):
+    return os.path.join(path, f"{table}.bin")
+
+# appends a headless game to a trace as it is played (see engine.py)
+class TraceWriter:
+    def __init__(self, path, seed):
+        os.makedirs(path, exist_ok = True)
+        self.path = path
+        self.seed = seed
+        # its own game instance gives the true animal positions every tick, like the visualizer's
+        self.game_instance = Game(seed)
+        for field in WORLD_FIELDS:
+            np.save(os.path.join(path, f"{field}.npy"), np.asarray(getattr(self.game_instance, field)))
+        self.files = {table: open(table_path(path, table), 'wb') for table in [*TABLES, INDEX_FILE]}
+        self.rows = dict.fromkeys(TABLES, 0)
+        self.ticks = 0
+        # how far through each relayer's knowledge log has been written, keyed by relayer id
+        self.knowledge_cursors = dict()
+        self.write_meta()
+
+    def append(self, table, records):
+        records = np.asarray(records, dtype = TABLES[table])
+        self.files[table].write(records.tobytes())
+        self.rows[table] += len(records)
+
+    # record one tick of the game: runners as (runner, state) pairs, relayers to read new knowledge from,
+    # and messages as (kind, sender_role, sender, receiver_role, receiver, size) tuples
+    def record_tick(self, runners, relayers, messages):
+        tick = self.ticks
+        self.append('runners', [(tick, runner.id, *runner.location,
+                                 RUNNER_WON if runner.won else RUNNER_ALIVE if runner.alive else RUNNER_DEAD)
+                                for runner in runners])
+        self.game_instance.step()
+        self.append('animals', [(tick, k, i, j) for k, (i, j) in enumerate(self.game_instance.animal_locations)])
+        self.append('messages', [(tick, *message) for message in messages])
+        for relayer in relayers:
+            cursor = self.knowledge_cursors.get(relayer.id, 0)
+            cells, _, self.knowledge_cursors[relayer.id] = relayer.knowledge.read(cursor, len(relayer.knowledge))
+            records = np.empty(len(cells), dtype = TABLES['knowledge'])
+            records['tick'], records['relayer'], records['cell'] = tick, relayer.id, cells
+            records['code'] = relayer.terrains[np.divmod(cells, MAP_DIMENSIONS[1])]
+            self.append('knowledge', records)
+        self.files[INDEX_FILE].write(np.array(tuple(self.rows.values()), dtype = INDEX).tobytes())
+        self.ticks += 1
+
+    def write_meta(self):
+        with open(os.path.join(self.path, 'trace.json'), 'w') as f:
+            json.dump(dict(version = TRACE_FORMAT_VERSION, seed = self.seed, ticks = self.ticks,
+                           map_dimensions = MAP_DIMENSIONS), f)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.write_meta()
+
+# memory-map a table of a trace read-only (empty tables can't be mapped, so they come back as empty arrays)
+def load_table(path, table, dtype):
+    if os.path.getsize(table_path(path, table)) == 0:
+        return np.empty(0, dtype = dtype)
+    return np.memmap(table_path(path, table), dtype = dtype, mode = 'r')
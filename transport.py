@@ -0,0 +1,263 @@
+import os
+import time
+import atexit
+import socket
+import struct
+import tempfile
+
+from framing import FramedSocket, FRAME_HEADER, RECV_SIZE
+
+# how processes reach each other, every process in a game must use the same one
+# 'tcp' uses loopback TCP, 'unix' uses unix domain sockets and 'shm' moves frames through shared memory ring buffers
+TRANSPORTS = ('tcp', 'unix', 'shm')
+# can be overridden per run with the ADELPHON_TRANSPORT environment variable, which child processes inherit
+TRANSPORT = os.environ.get('ADELPHON_TRANSPORT', 'tcp')
+assert TRANSPORT in TRANSPORTS
+# unix domain sockets are named after the port they replace
+SOCKET_DIR = os.path.join(tempfile.gettempdir(), 'adelphon_sockets')
+# bytes of frame data each shared memory ring can hold before the writer has to wait for the reader
+RING_CAPACITY = 1 << 20
+
+# build the transport selected by name (defaults to TRANSPORT)
+def make_transport(name = None):
+    name = TRANSPORT if name is None else name
+    if name == 'tcp':
+        return TCPTransport()
+    elif name == 'unix':
+        return UnixTransport()
+    elif name == 'shm':
+        return SharedMemoryTransport()
+    raise ValueError(f"Unknown transport: {name}")
+
+# every transport listens on and connects to the logical ports in common.py and hands out framed connections
+# listeners are plain sockets so that they can be registered with selectors
+class TCPTransport:
+    def __init__(self):
+        self.address = socket.gethostbyname(socket.gethostname())
+
+    def listen(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # let a new game reuse ports that the last one left in TIME_WAIT
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.address, port))
+        sock.listen()
+        return sock
+
+    def connect(self, port, max_frame_size):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect((self.address, port))
+        # messages are tiny and latency bound, so don't let Nagle hold them back
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return FramedSocket(sock, max_frame_size)
+
+    # returns the framed connection and a printable name for the peer
+    def accept(self, listener, max_frame_size):
+        conn, (addr, port) = listener.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return FramedSocket(conn, max_frame_size), f"{addr}:{port}"
+
+class UnixTransport:
+    def path(self, port):
+        return os.path.join(SOCKET_DIR, f"{port}.sock")
+
+    def listen(self, port):
+        os.makedirs(SOCKET_DIR, exist_ok = True)
+        path = self.path(port)
+        # clear out a socket file left behind by an earlier game
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.listen()
+        return sock
+
+    def connect(self, port, max_frame_size):
+        return FramedSocket(self.connect_socket(port), max_frame_size)
+
+    def connect_socket(self, port):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path(port))
+        return sock
+
+    def accept(self, listener, max_frame_size):
+        conn, _ = listener.accept()
+        return FramedSocket(conn, max_frame_size), self.path_name(listener)
+
+    def path_name(self, listener):
+        return os.path.basename(listener.getsockname())
+
+# unix domain sockets are only used to set up each connection and as a doorbell,
+# frames themselves go through a pair of shared memory rings (one per direction)
+class SharedMemoryTransport(UnixTransport):
+    def connect(self, port, max_frame_size):
+        sock = self.connect_socket(port)
+        outgoing = RingBuffer()
+        send_line(sock, outgoing.name)
+        incoming = RingBuffer(recv_line(sock))
+        return SharedMemoryConnection(sock, outgoing, incoming, max_frame_size)
+
+    def accept(self, listener, max_frame_size):
+        conn, _ = listener.accept()
+        conn.setblocking(True)
+        incoming = RingBuffer(recv_line(conn))
+        outgoing = RingBuffer()
+        send_line(conn, outgoing.name)
+        return SharedMemoryConnection(conn, outgoing, incoming, max_frame_size), self.path_name(listener)
+
+# newline terminated handshake helpers, only used before a connection starts carrying frames
+def send_line(sock, text):
+    sock.sendall(text.encode('utf-8') + b'\n')
+
+def recv_line(sock):
+    line = b''
+    while not line.endswith(b'\n'):
+        data = sock.recv(1)
+        if not data:
+            raise ConnectionError("Connection closed during shared memory handshake")
+        line += data
+    return line[:-1].decode('utf-8')
+
+# single producer single consumer byte ring in shared memory
+# the first 16 bytes hold the total bytes ever written (head, only moved by the writer)
+# and ever read (tail, only moved by the reader), the rest is the ring itself
+class RingBuffer:
+    COUNTERS = struct.Struct('<Q')
+    DATA_START = 2 * COUNTERS.size
+
+    # create a new ring, or attach to the ring with the given name
+    def __init__(self, name = None):
+        # imported here so that processes on the other transports never load multiprocessing
+        from multiprocessing import shared_memory, resource_tracker
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create = True, size = self.DATA_START + RING_CAPACITY)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name = name)
+            # the creating process is responsible for unlinking it, so don't let our tracker do it too
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+            self.owner = False
+        self.name = self.shm.name
+        self.capacity = self.shm.size - self.DATA_START
+        self.closed = False
+        # processes usually exit straight out of their main loop, so release the ring on the way out
+        atexit.register(self.close)
+
+    def head(self):
+        return self.COUNTERS.unpack_from(self.shm.buf, 0)[0]
+
+    def tail(self):
+        return self.COUNTERS.unpack_from(self.shm.buf, self.COUNTERS.size)[0]
+
+    # append bytes to the ring, waiting for the reader if there isn't room yet
+    def write(self, data):
+        if len(data) > self.capacity:
+            raise ValueError(f"Write of {len(data)} bytes can never fit in a ring of {self.capacity}")
+        head = self.head()
+        while self.capacity - (head - self.tail()) < len(data):
+            time.sleep(0)
+        self.copy_in(head % self.capacity, data)
+        # publish the new bytes only once they're all in place
+        self.COUNTERS.pack_into(self.shm.buf, 0, head + len(data))
+
+    def copy_in(self, position, data):
+        first = min(len(data), self.capacity - position)
+        start = self.DATA_START + position
+        self.shm.buf[start:start + first] = data[:first]
+        self.shm.buf[self.DATA_START:self.DATA_START + len(data) - first] = data[first:]
+
+    def copy_out(self, position, size):
+        first = min(size, self.capacity - position)
+        start = self.DATA_START + position
+        return bytes(self.shm.buf[start:start + first]) + bytes(self.shm.buf[self.DATA_START:self.DATA_START + size - first])
+
+    # remove and return every complete frame currently in the ring
+    def read_frames(self):
+        frames = []
+        head, tail = self.head(), self.tail()
+        while head - tail >= FRAME_HEADER.size:
+            (size,) = FRAME_HEADER.unpack(self.copy_out(tail % self.capacity, FRAME_HEADER.size))
+            # writers always put a whole frame in before moving head, so the payload is there too
+            frames.append(self.copy_out((tail + FRAME_HEADER.size) % self.capacity, size))
+            tail += FRAME_HEADER.size + size
+        self.COUNTERS.pack_into(self.shm.buf, self.COUNTERS.size, tail)
+        return frames
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+# framed connection over a pair of rings with the same interface as FramedSocket
+# the socket carries a one byte doorbell per batch of frames so selectors and blocking reads still wake up
+class SharedMemoryConnection:
+    DOORBELL = b'\x01'
+
+    def __init__(self, sock, outgoing, incoming, max_frame_size):
+        self.sock = sock
+        self.outgoing = outgoing
+        self.incoming = incoming
+        self.max_frame_size = max_frame_size
+        # frames already taken out of the ring by recv but not handed back yet
+        self.pending = []
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def setblocking(self, flag):
+        self.sock.setblocking(flag)
+
+    def close(self):
+        self.sock.close()
+        self.outgoing.close()
+        self.incoming.close()
+
+    def send(self, payload):
+        self.send_frames([payload])
+
+    def send_frames(self, payloads):
+        for payload in payloads:
+            if len(payload) > self.max_frame_size:
+                raise ValueError(f"Frame of {len(payload)} bytes is over the limit of {self.max_frame_size}")
+            self.outgoing.write(FRAME_HEADER.pack(len(payload)) + payload)
+        self.sock.sendall(self.DOORBELL)
+
+    # read pending doorbells, returns False once the peer has gone
+    # a peer that exits with our doorbells unread resets the socket, but its frames are safe in the ring
+    # so that is no different from a clean close
+    def read_doorbell(self):
+        try:
+            return bool(self.sock.recv(RECV_SIZE))
+        except BlockingIOError:
+            return True
+        except ConnectionResetError:
+            return False
+
+    # consume pending doorbells and return every frame in the ring, None once the peer has closed
+    def recv_frames(self):
+        closed = not self.read_doorbell()
+        # a peer can write its last frames and close straight after, so drain the ring before reporting it
+        frames, self.pending = self.pending + self.incoming.read_frames(), []
+        if closed and not frames:
+            return None
+        return frames
+
+    # frames that can already be read without waiting, e.g. ones that came in along with a frame read by recv,
+    # whose doorbells recv may have consumed so that a selector waiting on the socket won't report them
+    def buffered_frames(self):
+        frames, self.pending = self.pending + self.incoming.read_frames(), []
+        return frames
+
+    # blocking read of the next frame, b'' once the peer has closed
+    # the ring is always checked before sleeping on the doorbell, since a frame's doorbell may already have been read
+    def recv(self):
+        while not self.pending:
+            self.pending = self.incoming.read_frames()
+            if self.pending:
+                break
+            if not self.read_doorbell():
+                return b''
+        return self.pending.pop(0)
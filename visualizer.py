@@ -1,6 +1,5 @@
-import sys
-import os, signal
-import socket
+import sys, os
+import argparse
 import selectors
 import types
 import matplotlib.pyplot as plt
@@ -10,7 +9,9 @@ from matplotlib.patches import RegularPolygon
 from collections import OrderedDict
 
 from game import *
-from common import alert_spawn_process
+from common import *
+from transport import make_transport
+from config import apply_config, load_config
 
 NON_TERRAIN_COLOR_MAP = OrderedDict([
     ('treasure', convert_color([121, 245, 110])),
@@ -19,47 +20,116 @@ NON_TERRAIN_COLOR_MAP = OrderedDict([
     ('relayer', convert_color([17, 237, 230])),
 ])
 BLANK_COLOR = convert_color([255, 255, 255])
-BLANK_INDEX = -1
 interval = (len(Terrain), len(Terrain) + len(NON_TERRAIN_COLOR_MAP.keys()))
 TREASURE_INDEX, ANIMAL_INDEX, RUNNER_INDEX, RELAYER_INDEX = [i for i in range(*interval)]
 
 color_map = ListedColormap([BLANK_COLOR, *TERRAIN_COLOR_MAP.values(), *NON_TERRAIN_COLOR_MAP.values()])
 
+# offsets of the cells in a blot from its center
+BLOT_OFFSETS = np.array([(di, dj) for di in range(-1, 2) for dj in range(-1, 2)])
+
 # helper function to create a 3x3 square with value val centered at loc
 def blot(map, loc, val):
     i, j = loc
     map[max(i-1, 0): i+2, max(j-1, 0): j+2] = val
     return map
 
+# flat indices of the cells that blot would paint around each location on a map of the given dims
+# (edge cells can repeat)
+def blot_cells(locations, dims):
+    locations = np.asarray(list(locations), dtype = np.int64).reshape(-1, 1, 2)
+    i = np.clip(locations[..., 0] + BLOT_OFFSETS[:, 0], 0, dims[0] - 1)
+    j = np.clip(locations[..., 1] + BLOT_OFFSETS[:, 1], 0, dims[1] - 1)
+    return (i * dims[1] + j).ravel()
+
+# a map shown as a background that changes rarely with 3x3 blots on top that move every frame
+# redrawing only touches the cells blotted last frame and the cells blotted now, instead of rebuilding the map
+class BlotLayer:
+    def __init__(self, background):
+        self.background = background
+        self.map = background.copy()
+        self.blotted = np.empty(0, dtype = np.int64)
+
+    # change some background cells (flat indices), the next draw puts any blots back on top of them
+    def set_background(self, cells, values):
+        self.background.flat[cells] = values
+        self.map.flat[cells] = values
+
+    # replace last frame's blots with the given (locations, value) pairs, later pairs drawn on top
+    def draw(self, blots):
+        self.map.flat[self.blotted] = self.background.flat[self.blotted]
+        cells = []
+        for locations, value in blots:
+            cells.append(blot_cells(locations, self.map.shape))
+            self.map.flat[cells[-1]] = value
+        self.blotted = np.concatenate(cells) if cells else np.empty(0, dtype = np.int64)
+        return self.map
+
+# writes out every frame the visualizer draws, without needing a display
+# a path ending in .npz collects the true and relayer maps of every frame into one compressed archive, which skips
+# rendering entirely, anything else is a directory that gets a numbered PNG of the whole figure per frame
+class FrameExporter:
+    def __init__(self, path):
+        self.path = path
+        self.archive = path.endswith('.npz')
+        self.ticks, self.true_maps, self.relayer_maps = [], [], []
+        if not self.archive:
+            os.makedirs(path, exist_ok = True)
+
+    def write(self, tick, fig, true_map, relayer_map):
+        if self.archive:
+            self.ticks.append(tick)
+            self.true_maps.append(true_map.copy())
+            self.relayer_maps.append(relayer_map.copy())
+        else:
+            plt.imsave(os.path.join(self.path, f"frame_{tick:06d}.png"), np.asarray(fig.canvas.buffer_rgba()))
+
+    def close(self):
+        if self.archive and self.ticks:
+            np.savez_compressed(self.path, ticks = np.array(self.ticks), true_maps = np.stack(self.true_maps),
+                                relayer_maps = np.stack(self.relayer_maps))
+
 class Visualizer:
-    def __init__(self, seed):
+    def __init__(self, seed, export = None):
         print("Visualizer is up and visualizing")
+        # exporting renders into an offscreen buffer instead of a window
+        self.exporter = None
+        if export is not None:
+            plt.switch_backend('Agg')
+            self.exporter = FrameExporter(export)
         # setup sockets
-        self.address = socket.gethostbyname(socket.gethostname())
+        self.transport = make_transport()
         self.sel = selectors.DefaultSelector()
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.bind((self.address, VISUALIZER_PORT))
-        self.sock.listen()
+        self.sock = self.transport.listen(VISUALIZER_PORT)
         self.sock.setblocking(False)
         self.sel.register(self.sock, selectors.EVENT_READ, data=None)
 
         # setup game instance and related data structures
         self.game_instance = Game(seed)
-        self.base_map = self.get_base_map()
-        self.relayer_map = self.get_relayer_base_map()
-        self.runner_locations = []
-        self.runner_attendance = 0
+        # the true map is the terrain with animals and runners blotted on top, the relayer map is everything the
+        # relayers know between them with what they've seen of the treasure, animals and runners blotted on top
+        self.true_layer = BlotLayer(self.get_base_map())
+        self.relayer_layer = BlotLayer(self.get_relayer_base_map())
+        # latest frame heard from each runner, and latest frame with the first band of its map from each relayer
+        # game processes don't wait for the visualizer, so it draws whatever is newest and may never see some frames,
+        # except when exporting, when they send every frame and every tick is drawn (see handle_data)
+        self.runner_frames = dict()
+        self.relayer_frames = dict()
+        # (first row, band of a relayer's knowledge map) from every relayer frame since the last draw
+        self.fresh_bands = []
+        self.drawn_tick = 0
+        self.connections = 0
+        self.accepted = 0
         self.runner_count = NUM_RUNNERS
-        self.relayer_attendance = 0
-        self.won = False
 
         # setup plotting
-        fig, self.axes = plt.subplots(ncols = 2, figsize = (12, 8))
+        self.fig, self.axes = plt.subplots(ncols = 2, figsize = (12, 8))
+        fig = self.fig
         plt.suptitle("Adelphon", fontsize = 28, y = 0.9)
         self.axes[0].set_title("True Game Map")
-        self.true_im = self.axes[0].imshow(self.base_map, cmap = color_map, vmin = -1, vmax = interval[1] - 1, 
+        self.true_im = self.axes[0].imshow(self.true_layer.map, cmap = color_map, vmin = -1, vmax = interval[1] - 1, 
                                            aspect = 'equal', interpolation = 'none')
-        self.relayer_im = self.axes[1].imshow(self.relayer_map, cmap = color_map, vmin = -1, vmax = interval[1] - 1, 
+        self.relayer_im = self.axes[1].imshow(self.relayer_layer.map, cmap = color_map, vmin = -1, vmax = interval[1] - 1, 
                                               aspect = 'equal', interpolation = 'none')
         self.axes[1].set_title("Total Relayer Knowledge")
 
@@ -95,14 +165,28 @@ class Visualizer:
         blank = mlines.Line2D([], [], color = '#FFFFFF', marker = 'D', markersize = 5, label = 'Blank')
         fig.legend(handles = [treasure, animal, runner, relayer, flat_ground, rocks, mud, quicksand, blank],
                    title = "Legend", loc = 'lower right', bbox_to_anchor = (0.5, 0.5, 0.5, 0.5), fontsize = "9", fancybox = True)
-        plt.ion()
+
+        # blitting: everything that changes between frames is animated, so a full draw leaves it out and only
+        # captures the static background, then each frame restores that background and redraws just these artists
+        # (in this order, so the fixed circles and the treasure, which sit on top of the maps, are included too)
+        self.animated = [self.true_im, self.relayer_im, *comm_radius_circles, *self.kill_radius_circles,
+                         *self.treasure_radius_circles, hexagon]
+        for artist in self.animated:
+            artist.set_animated(True)
+        self.background = None
+        # a full draw happens whenever the window is resized, which invalidates the captured background
+        fig.canvas.mpl_connect('draw_event', self.on_draw)
+        if self.exporter is None:
+            plt.ion()
+            plt.show(block = False)
+        fig.canvas.draw()
 
         # tell spawner that everything has been set up correctly
         alert_spawn_process()
 
     # helper function that constructs base map with fixed treasure and relayer locations
     def get_base_map(self):
-        map = self.game_instance.terrain.copy()
+        map = np.array(self.game_instance.terrain)
         for loc in self.game_instance.relayer_locations:
             map = blot(map, loc, RELAYER_INDEX)
         return map
@@ -113,139 +197,162 @@ class Visualizer:
             map = blot(map, loc, RELAYER_INDEX)
         return map
 
-    # helper function that adds blots for animals to the map after getting animal info from the game
-    def add_animals(self, map):
-        for loc in self.game_instance.animal_locations:
-            map = blot(map, loc, ANIMAL_INDEX)
-        return map
+    # capture the static background after a full draw and draw the animated artists over it
+    def on_draw(self, event):
+        canvas = self.fig.canvas
+        self.background = canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self.animated:
+            self.fig.draw_artist(artist)
 
-    # helper function that decodes list of terrain info and adds them to a blank map
-    def add_terrain(self, terra):
-        for (i, j, t) in terra:
-            # only overwrite blank parts of the map because all game objects are more important than terrain
-            if self.relayer_map[i,j] == BLANK_INDEX:
-                self.relayer_map[i, j] = t
+    # put the static background back and redraw only the animated artists on top of it
+    def blit(self):
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+        for artist in self.animated:
+            self.fig.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
 
-    # runs one step of the visualizer by updating plots and resetting state
-    def one_step(self):
-        assert len(self.runner_locations) == self.runner_count
+    # fold the terrain in relayer frames that arrived since the last draw into the relayer map
+    # only cells that are still blank change, since terrain never changes once it is known
+    def add_relayer_terrain(self):
+        cols = self.relayer_layer.background.shape[1]
+        for first_row, band in self.fresh_bands:
+            terrain = band.ravel()
+            background = self.relayer_layer.background[first_row:first_row + len(band)].ravel()
+            new = np.flatnonzero((background == BLANK_INDEX) & (terrain >= 0))
+            self.relayer_layer.set_background(first_row * cols + new, terrain[new])
+        self.fresh_bands.clear()
 
-        # need to query so that visualizer's game instance is on the same page as the other game instances
-        # i.e. we just want the update side effects of querying
-        self.game_instance.query((0, 0), is_runner = False)
-        map = self.add_animals(self.base_map.copy())
-        for loc in self.runner_locations:
-            map = blot(map, loc, RUNNER_INDEX)
+    # redraw both maps from the latest frames if any runner has moved on since the last draw
+    def one_step(self):
+        tick = max((frame.tick for frame in self.runner_frames.values()), default = self.drawn_tick)
+        if tick <= self.drawn_tick:
+            return
+        # catch the visualizer's game instance up with the other game instances, however many frames were skipped
+        self.game_instance.advance_to(tick)
+        runner_locations = [frame.locations[0] for _, frame in sorted(self.runner_frames.items())]
+        true_map = self.true_layer.draw([(self.game_instance.animal_locations, ANIMAL_INDEX),
+                                         (runner_locations, RUNNER_INDEX)])
+        self.add_relayer_terrain()
+        relayer_frames = list(self.relayer_frames.values())
+        relayer_map = self.relayer_layer.draw([
+            ([frame.treasure for frame in relayer_frames if frame.treasure], TREASURE_INDEX),
+            ([animal for frame in relayer_frames for animal in frame.animals], ANIMAL_INDEX),
+            ([runner for frame in relayer_frames for runner in frame.locations], RUNNER_INDEX)])
+        self.drawn_tick = tick
+        # the archive only needs the maps themselves
+        if self.exporter is not None and self.exporter.archive:
+            self.exporter.write(tick, self.fig, true_map, relayer_map)
+            return
 
         # update plots
-        self.true_im.set_data(map)
-        self.relayer_im.set_data(self.relayer_map)
+        self.true_im.set_data(true_map)
+        self.relayer_im.set_data(relayer_map)
         # update kill radius circles to stay centered at animal locations
         for circle, loc in zip(self.kill_radius_circles, self.game_instance.animal_locations):
             circle.set(center = loc[::-1])
-         # update treasure radius circles to stay centered at runner locations
-        for circle, loc in zip(self.treasure_radius_circles, self.runner_locations):
-            circle.set(center = loc[::-1])
-        plt.pause(0.01)
-
-        # reset attendance and locations
-        self.relayer_map = self.get_relayer_base_map()
-        self.runner_attendance = 0
-        self.relayer_attendance = 0
-        self.runner_locations = []
+        # update treasure radius circles to stay centered at runner locations, hiding the ones for runners that are gone
+        for k, circle in enumerate(self.treasure_radius_circles):
+            if k < len(runner_locations):
+                circle.set(center = runner_locations[k][::-1], visible = True)
+            else:
+                circle.set(visible = False)
+        self.blit()
+        if self.exporter is not None:
+            self.exporter.write(tick, self.fig, true_map, relayer_map)
 
     # a wrapper function for accepting sockets w/ selector
     def accept_wrapper(self, sock):
-        conn, (addr, port) = sock.accept()
+        conn, peer = self.transport.accept(sock, VISUALIZER_TRANSMISSION_SIZE_LIMIT)
         conn.setblocking(False)
         events = selectors.EVENT_READ
-        self.sel.register(conn, events, data = types.SimpleNamespace(port = port))
+        # runners are filled in as the connection sends runner frames, a runner host sends them for many runners
+        self.sel.register(conn, events, data = types.SimpleNamespace(peer = peer, runners = set()))
+        self.connections += 1
+        self.accepted += 1
+
+    # the game is over once every process that connected has left
+    def finished(self):
+        return self.accepted > 0 and self.connections == 0
+
+    # handle every connection that is ready within timeout (None waits forever), returns whether there were any
+    def poll(self, timeout):
+        events = self.sel.select(timeout = timeout)
+        for key, _ in events:
+            if key.data is None:
+                self.accept_wrapper(key.fileobj)
+            else:
+                self.service_connection(key)
+        return bool(events)
 
     # process incoming data from a connection
     def service_connection(self, key):
-        assert self.relayer_attendance <= NUM_RELAYERS
-        assert self.runner_attendance <= self.runner_count
         sock = key.fileobj
         data = key.data
-        recv_data = sock.recv(VISUALIZER_TRANSMISSION_SIZE_LIMIT)
-        if not recv_data:
-            if not self.won:
-                raise ConnectionError(f"Lost connection to socket on port {data.port}")
-            else:
-                # all good if you've already won since sys exits won't be perfectly in sync
-                self.sel.unregister(sock)
-                sock.close()
-                return
-        recv_data = recv_data.decode("utf-8").split("|")
-        is_dead_runner = False
-        if recv_data[0] == RUNNER_CODE:
-            # special case for runner either dying or winning
-            if len(recv_data) == 3:
-                msg = recv_data[2]
-                if msg == IM_DEAD:
-                    is_dead_runner = True
-                    id = int(recv_data[1])
-                    # remove a circle for dead runner
-                    self.treasure_radius_circles[-1].remove()
-                    self.treasure_radius_circles.pop()
-                    self.runner_count -= 1
-                    if self.runner_count == 0:
-                        print("GAME OVER: All runners have died")
-                        # kill the parent (spawning process) and the visualizer itself
-                        os.kill(os.getppid(), signal.SIGTERM)
-                        sys.exit() # GAME OVER
-                elif msg == I_WON:
-                    self.runner_attendance += 1
-                    self.won = True # GAME OVER but wait to let all runners know before killing this process
-                else:
-                    raise ValueError(f"Invalid msg: {msg}")
-            # standard runner case
-            else:
-                self.runner_attendance += 1
-                self.runner_locations.append(eval(recv_data[1]))
-        elif recv_data[0] == RELAYER_CODE:
-            self.relayer_attendance += 1
-            # add current relayer's info to the master relayer map for this time step
-            _, id, treasure_location, animal_locations, terrains, known_runner_locations = recv_data
-            self.add_terrain(eval(terrains))
-            if eval(treasure_location):
-                self.relayer_map = blot(self.relayer_map, eval(treasure_location), TREASURE_INDEX)
-            for animal in eval(animal_locations):
-                self.relayer_map = blot(self.relayer_map, animal, ANIMAL_INDEX)
-            for runner in eval(known_runner_locations):
-                self.relayer_map = blot(self.relayer_map, runner, RUNNER_INDEX)
-        else:
-            raise Exception(f"Invalid data: {recv_data}")
-
-        # once it has heard back from everyone, the visualizer should one step
-        if self.runner_attendance == self.runner_count and self.relayer_attendance == NUM_RELAYERS:
-            self.one_step()
-        # respond back to all relayers and runners
-        sock.send(MESSAGE_RECEIVED.encode("utf-8"))
-        # close socket for this runner
-        if is_dead_runner:
+        frames = sock.recv_frames()
+        if frames is None:
+            # game processes leave as soon as the game is over for them, and a runner's last message may not have
+            # made it out before it left, so a runner whose connection closes is gone either way
+            for runner in data.runners:
+                self.runner_frames.pop(runner, None)
             self.sel.unregister(sock)
             sock.close()
-        # kill the parent (spawning process) and the visualizer itself
-        # after you've heard from and responded to all runners
-        if self.runner_attendance == self.runner_count and self.won:
-            os.kill(os.getppid(), signal.SIGTERM)
-            sys.exit()
-
-def main(seed):
-    visualizer = Visualizer(seed)
+            self.connections -= 1
+            return
+        for frame in frames:
+            self.handle_data(data, frame)
+
+    # process one message received on a connection
+    def handle_data(self, data, recv_data):
+        message = decode(recv_data)
+        # special case for runner either dying or winning
+        if message.kind == KIND_IM_DEAD:
+            self.runner_frames.pop(message.id, None)
+            self.runner_count -= 1
+            if self.runner_count == 0:
+                print("GAME OVER: All runners have died")
+        elif message.kind == KIND_I_WON:
+            self.runner_frames.pop(message.id, None)
+        # standard runner case
+        elif message.kind == KIND_RUNNER_FRAME:
+            # an exported game gets a frame for every tick, so the tick so far is drawn before a frame moves past it
+            if self.exporter is not None and message.tick > max((frame.tick for frame in self.runner_frames.values()),
+                                                                default = self.drawn_tick):
+                self.one_step()
+            data.runners.add(message.id)
+            self.runner_frames[message.id] = message
+        elif message.kind == KIND_RELAYER_FRAME:
+            first_row, band = message.terrain
+            # the treasure, animals and runners only come with the first band
+            if first_row == 0:
+                self.relayer_frames[message.id] = message
+            self.fresh_bands.append(message.terrain)
+        else:
+            raise ValueError(f"Invalid message kind: {message.kind}")
+
+def main(seed, export = None):
+    # watch with the same configuration as everyone else (see config.py)
+    apply_config(load_config())
+    visualizer = Visualizer(seed, export)
     try:
-        while True:
-            events = visualizer.sel.select(timeout=None)
-            for key, _ in events:
-                if key.data is None:
-                    visualizer.accept_wrapper(key.fileobj)
-                else:
-                    visualizer.service_connection(key)
+        while not visualizer.finished():
+            visualizer.poll(timeout = None)
+            # take in everything else that has already arrived so that only the latest state gets drawn
+            while visualizer.poll(timeout = 0):
+                pass
+            visualizer.one_step()
     except KeyboardInterrupt:
-        plt.ioff()
-        sys.exit()
+        pass
+    if visualizer.exporter is not None:
+        visualizer.exporter.close()
+    plt.ioff()
+    sys.exit()
 
 if __name__ == '__main__':
-    assert len(sys.argv) == 2, "This program only takes the required argument seed"
-    main(int(sys.argv[1]))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description = "Watch a game of Adelphon")
+    parser.add_argument('seed', type = int)
+    parser.add_argument('--export', metavar = 'PATH', help = "write frames to a directory of PNGs, or to a "
+                        "compressed archive of the raw maps if PATH ends in .npz, instead of showing them")
+    args = parser.parse_args()
+    main(args.seed, args.export)
@@ -0,0 +1,111 @@
+import os
+import shutil
+import hashlib
+import tempfile
+from collections import namedtuple
+import numpy as np
+
+# every cached world lives in its own subdirectory of here, as one .npy file per array
+WORLD_CACHE_DIR = os.environ.get('ADELPHON_WORLD_CACHE', os.path.join(tempfile.gettempdir(), 'adelphon_worlds'))
+# bump whenever world generation changes so stale caches are never attached to
+WORLD_FORMAT_VERSION = 3
+
+# static part of a game: everything that is fixed once the seed is chosen
+WorldSnapshot = namedtuple('WorldSnapshot', ['terrain', 'relayer_locations', 'runner_start_locations',
+                                             'animal_locations', 'animal_movements', 'treasure'])
+
+# directory name for a world: the seed plus a digest of every parameter that affects generation
+def world_path(seed, params):
+    digest = hashlib.sha1(repr((WORLD_FORMAT_VERSION, sorted(params.items()))).encode('utf-8')).hexdigest()
+    return os.path.join(WORLD_CACHE_DIR, f"{seed}-{digest[:16]}")
+
+# attach read-only to a cached world, returns None if it hasn't been built yet
+def load_world(path):
+    if not os.path.isdir(path):
+        return None
+    return WorldSnapshot(*[np.load(os.path.join(path, f"{field}.npy"), mmap_mode = 'r') 
+                           for field in WorldSnapshot._fields])
+
+# write a freshly generated world to the cache and return the read-only attached copy
+# the world is written to a private directory and renamed into place, so readers never see a partial world
+# and if another process wins the race we just attach to its copy instead
+def save_world(path, snapshot):
+    try:
+        os.makedirs(WORLD_CACHE_DIR, exist_ok = True)
+        tmp = tempfile.mkdtemp(dir = WORLD_CACHE_DIR)
+        for field, array in zip(WorldSnapshot._fields, snapshot):
+            np.save(os.path.join(tmp, f"{field}.npy"), np.asarray(array))
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors = True)
+            if not os.path.isdir(path):
+                raise
+    except OSError:
+        # the cache is only an optimization, so fall back to the in-memory world if it can't be written
+        return snapshot
+    return load_world(path)
+
+# every cached world keeps the state of its animals every CHECKPOINT_INTERVAL ticks, so any process (or a later run
+# of the same seed) can get to any tick from the closest checkpoint before it instead of from the start
+CHECKPOINT_INTERVAL = 128
+
+# directory for a world's checkpoints: the world's own directory plus a digest of the parameters animal moves depend on
+def checkpoint_path(path, params):
+    digest = hashlib.sha1(repr((WORLD_FORMAT_VERSION, sorted(params.items()))).encode('utf-8')).hexdigest()
+    return os.path.join(path, f"checkpoints-{digest[:16]}")
+
+# checkpoints are written by whichever process first plays through their tick, one .npy file each, and are kept
+# in memory as well so that a cache that can't be written to still helps this process
+class CheckpointStore:
+    def __init__(self, path):
+        self.path = path
+        self.states = dict()
+
+    def filename(self, clock):
+        return os.path.join(self.path, f"{clock}.npy")
+
+    def load(self, clock):
+        if clock not in self.states:
+            try:
+                self.states[clock] = np.load(self.filename(clock))
+            except (OSError, ValueError):
+                return None
+        return self.states[clock]
+
+    # the latest checkpoint at or before clock as (clock, state), or (0, None) if there isn't one
+    # usually someone has already played past clock and the checkpoint just before it is there, otherwise the
+    # furthest one is found with one look at the directory rather than by trying every interval below clock
+    def latest(self, clock):
+        checkpoint = clock // CHECKPOINT_INTERVAL * CHECKPOINT_INTERVAL
+        if checkpoint > 0 and self.load(checkpoint) is not None:
+            return checkpoint, self.states[checkpoint]
+        saved = {checkpoint for checkpoint in self.states if checkpoint <= clock}
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            names = []
+        for name in names:
+            stem, extension = os.path.splitext(name)
+            if extension == '.npy' and stem.isdigit() and 0 < int(stem) <= clock:
+                saved.add(int(stem))
+        for checkpoint in sorted(saved, reverse = True):
+            state = self.load(checkpoint)
+            if state is not None:
+                return checkpoint, state
+        return 0, None
+
+    # like the world itself, written privately and renamed into place so readers never see a partial checkpoint
+    def save(self, clock, state):
+        if clock in self.states:
+            return
+        self.states[clock] = state
+        if os.path.exists(self.filename(clock)):
+            return
+        try:
+            os.makedirs(self.path, exist_ok = True)
+            with tempfile.NamedTemporaryFile(dir = self.path, suffix = '.npy', delete = False) as f:
+                np.save(f, state)
+            os.replace(f.name, self.filename(clock))
+        except OSError:
+            pass